@@ -2,6 +2,7 @@
 
 import os
 from celery import Celery
+from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_travel_app.settings')
@@ -13,11 +14,13 @@ app = Celery('alx_travel_app')
 # the configuration object to child processes.
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
-# Load task modules from all registered Django app configs.
-app.autodiscover_tasks()
+# Load task modules only from the apps that define them, rather than
+# scanning every INSTALLED_APP for a tasks module.
+app.autodiscover_tasks(['listings'], force=False)
 
 
-@app.task(bind=True)
-def debug_task(self):
-    # A simple debug task to verify Celery is working
-    print(f'Request: {self.request!r}')
\ No newline at end of file
+if settings.DEBUG:
+    @app.task(bind=True)
+    def debug_task(self):
+        # A simple debug task to verify Celery is working
+        print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -0,0 +1,85 @@
+# listings/cache.py
+
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+class ListingCache:
+    """
+    Cross-request cache of full `ListingSerializer` representations, keyed
+    by listing primary key and the listing's current version token. Entries
+    are dropped by the handlers in `listings.signals` whenever something a
+    representation shows changes.
+
+    Disabled (every lookup misses) unless `settings.LISTING_CACHE_ENABLED`.
+    """
+    version = 1
+    timeout = 60 * 5
+
+    @staticmethod
+    def enabled():
+        return settings.LISTING_CACHE_ENABLED
+
+    @classmethod
+    def version_key(cls, pk):
+        return f"listing:{pk}:v{cls.version}:token"
+
+    @classmethod
+    def key(cls, pk, token):
+        return f"listing:{pk}:v{cls.version}:{token}"
+
+    @classmethod
+    def tokens(cls, pks):
+        """
+        Returns a dict mapping each pk in `pks` to the listing's version
+        token, starting a new random token for listings without one. Read
+        the tokens before loading the listings they will be cached under.
+        """
+        if not cls.enabled():
+            return {}
+        keys = {cls.version_key(pk): pk for pk in pks}
+        tokens = {keys[key]: token for key, token in cache.get_many(keys).items()}
+        new = {pk: uuid.uuid4().hex for pk in pks if pk not in tokens}
+        if new:
+            cache.set_many({cls.version_key(pk): token for pk, token in new.items()}, None)
+            tokens.update(new)
+        return tokens
+
+    @classmethod
+    def get_many(cls, tokens):
+        """
+        Returns a dict mapping each pk in `tokens` (as returned by `tokens()`)
+        that is cached to its representation.
+        """
+        if not tokens:
+            return {}
+        keys = {cls.key(pk, token): pk for pk, token in tokens.items()}
+        return {keys[key]: data for key, data in cache.get_many(keys).items()}
+
+    @classmethod
+    def set_many(cls, representations, tokens):
+        """
+        Caches a dict mapping listing pks to their representations, under
+        the `tokens` read before the listings were loaded.
+        """
+        if cls.enabled():
+            cache.set_many({
+                cls.key(pk, tokens[pk]): data for pk, data in representations.items() if pk in tokens
+            }, cls.timeout)
+
+    @classmethod
+    def invalidate(cls, pks):
+        """
+        Drops the version tokens of the listings in `pks` once the current
+        transaction commits. Tokens are never reused, so a representation
+        read before the commit and cached afterwards under the old token is
+        never served.
+        """
+        if not cls.enabled():
+            return
+        keys = [cls.version_key(pk) for pk in pks]
+        if keys:
+            transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,64 @@
+# listings/chapa.py
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+CHAPA_API_URL = 'https://api.chapa.co/v1'
+# (connect, read) timeouts in seconds
+CHAPA_TIMEOUT = (3.05, 10)
+
+
+def build_session():
+    """
+    Returns a `requests.Session` whose pooled connections to Chapa are kept
+    alive and reused, instead of a new TCP/TLS handshake per API call.
+    """
+    session = requests.Session()
+    # Retry verification GETs on gateway errors; initialization POSTs are
+    # never retried, so a transaction is not created twice
+    retry = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET'}),
+    )
+    session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+    # The secret key does not change at runtime; send it with every call
+    session.headers.update({
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}"
+    })
+    return session
+
+
+# One session per process, shared by the web views and the Celery tasks
+session = build_session()
+
+
+def initialize_transaction(payload):
+    """
+    Starts a Chapa checkout for `payload` and returns the response.
+    """
+    # The session already sends the JSON Content-Type
+    return session.post(f'{CHAPA_API_URL}/transaction/initialize', data=orjson.dumps(payload), timeout=CHAPA_TIMEOUT)
+
+
+def verify_transaction(tx_ref):
+    """
+    Asks Chapa for the status of the transaction `tx_ref` and returns the response.
+    """
+    return session.get(f'{CHAPA_API_URL}/transaction/verify/{tx_ref}', timeout=CHAPA_TIMEOUT)
+
+
+def response_json(response):
+    """
+    Decodes a Chapa response body with orjson. Like `response.json()`, a
+    malformed body raises a `requests` exception.
+    """
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError as e:
+        raise requests.exceptions.InvalidJSONError(str(e), response=response)
@@ -18,8 +18,29 @@ class AMENITIES(models.TextChoices):
     GYM = "GYM", "Gym" 
     PARKING = 'PARKING', 'Parking'
     
+# Stored form of AMENITIES; the API keeps using the AMENITIES codes.
+class AmenityType(models.IntegerChoices):
+    WI_FI = 1, 'wi-fi'
+    POOL = 2, 'Swimming Pool'
+    PETS = 3, 'Pets Allowed'
+    GYM = 4, 'Gym'
+    PARKING = 5, 'Parking'
+
 class PaymentStatus(models.TextChoices):
     PENDING = 'PENDING', 'Pending'
     COMPLETED = 'COMPLETED', 'Completed'
     FAILED = 'FAILED', 'Failed'
-    
\ No newline at end of file
+    
+
+# `TextChoices.choices` builds a new list on every access; model fields
+# take these tuples instead.
+ROLE_CHOICES = tuple(Roles.choices)
+BOOKING_STATUS_CHOICES = tuple(BookingStatus.choices)
+AMENITY_CHOICES = tuple(AMENITIES.choices)
+AMENITY_TYPE_CHOICES = tuple(AmenityType.choices)
+PAYMENT_STATUS_CHOICES = tuple(PaymentStatus.choices)
+
+# Plain lookups between the API codes and the stored integers, e.g.
+# 'WI-FI' <-> 1.
+AMENITY_TYPES = {AMENITIES[member.name].value: member.value for member in AmenityType}
+AMENITY_CODES = {value: code for code, value in AMENITY_TYPES.items()}
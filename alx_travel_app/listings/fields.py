@@ -0,0 +1,78 @@
+# listings/fields.py
+
+from decimal import Decimal
+
+from django.db import models
+
+
+def format_timestamp(value):
+    """
+    Formats a datetime as e.g. "Aug 17, 2025, 02:30 p.m." in a single pass.
+    """
+    hour = value.hour
+    suffix = 'a.m.' if hour < 12 else 'p.m.'
+    return f"{value:%b %d, %Y}, {hour % 12 or 12:02d}:{value.minute:02d} {suffix}"
+
+
+class FormattedTimestampField(models.CharField):
+    """
+    Stores the `format_timestamp` rendering of another datetime field on the
+    same model, so it is formatted once per row rather than on every read.
+
+    The value is filled in `pre_save`, which (unlike a pre_save signal) also
+    runs for `bulk_create()` and after `auto_now_add` has set the source.
+    Declare it after its source field so the source is set first.
+    """
+
+    def __init__(self, *args, source='created_at', **kwargs):
+        self.source = source
+        kwargs.setdefault('max_length', 32)
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        for key, default in (('max_length', 32), ('null', True), ('blank', True), ('editable', False)):
+            if kwargs.get(key) == default:
+                del kwargs[key]
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if not value:
+            source = getattr(model_instance, self.source)
+            if source is not None:
+                value = format_timestamp(source)
+                setattr(model_instance, self.attname, value)
+        return value
+
+
+class CentsField(models.BigIntegerField):
+    """
+    Stores a DecimalField amount on the same model as an integer number of
+    cents, so hot paths can do price arithmetic on ints. Like
+    `FormattedTimestampField` it is filled in `pre_save`, recomputed on
+    every save so it follows changes to the source; include both fields in
+    `update_fields` when saving only the source.
+    """
+
+    def __init__(self, *args, source, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        if kwargs.get('editable') is False:
+            del kwargs['editable']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        source = getattr(model_instance, self.source)
+        value = None if source is None else int(Decimal(str(source)).scaleb(2).to_integral_value())
+        setattr(model_instance, self.attname, value)
+        return value
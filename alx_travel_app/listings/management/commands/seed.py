@@ -1,12 +1,34 @@
+from django.contrib.auth.hashers import make_password
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
-import hashlib
 from decimal import Decimal
+import os
+import uuid
 
 # Import your models 
-from listings.enums import AMENITIES, Roles # Import AMENITIES and UserRole
+from listings.enums import AmenityType, Roles # Import AmenityType and UserRole
 from listings.models import Users, Listing, PropertyFeature
 
+# Rows per INSERT statement for bulk_create().
+BATCH_SIZE = 500
+# The watchlist through-table rows are two UUIDs wide, so batch them larger.
+WATCHLIST_BATCH_SIZE = 1000
+
+# Auto-created M2M table behind Listing.watchlist
+Watchlist = Listing.watchlist.through
+
+# Login password shared by every seeded user.
+SEED_PASSWORD = 'seed-pass'
+
+
+def uuid4_batch(n):
+    """
+    Returns `n` random (version 4) UUIDs drawn from a single os.urandom() call.
+    """
+    raw = os.urandom(16 * n)
+    return [uuid.UUID(bytes=raw[i * 16:(i + 1) * 16], version=4) for i in range(n)]
+
+
 class Command(BaseCommand):
     """
     Django custom management command to populate the database with sample
@@ -21,80 +43,62 @@ class Command(BaseCommand):
         """
         self.stdout.write(self.style.SUCCESS('Starting database population for listings...'))
 
+        users_data = [
+            {
+                'username': 'admin_airbnb_clone', 'email': 'admin_airbnb_clone@gmail.com',
+                'first_name': 'Admin', 'last_name': 'Admin', 'role': Roles.ADMIN,
+                'is_staff': True,
+            },
+            {
+                'username': 'lifeisshort', 'email': 'lifeisshort@gmail.com',
+                'first_name': 'Samuel', 'last_name': 'John', 'role': Roles.HOST,
+                'phone_number': '2348216723456',
+            },
+            {
+                'username': 'sani_bil', 'email': 'sani_bil@gmail.com',
+                'first_name': 'Bilal', 'last_name': 'Sanni', 'role': Roles.HOST,
+                'phone_number': '2348216723456',
+            },
+            {
+                'username': 'abu_yinuz', 'email': 'abu_yinuz@gmail.com',
+                'first_name': 'Abubakar', 'last_name': 'Yinuz', 'role': Roles.GUEST,
+            },
+            {
+                'username': 'akpan_dan', 'email': 'akpan_dan@gmail.com',
+                'first_name': 'Dan', 'last_name': 'Akpan', 'role': Roles.GUEST,
+            },
+            {
+                'username': 'ken.willy', 'email': 'ken.willy@gmail.com',
+                'first_name': 'Ken', 'last_name': 'Williams', 'role': Roles.GUEST,
+            },
+        ]
+
         try:
             with transaction.atomic():
-                # 1. Create or get admin users
-                admin, admin_created = Users.objects.get_or_create(
-                    username='admin_airbnb_clone',
-                    email='admin_airbnb_clone@gmail.com',
-                    defaults={'first_name': 'Admin', 'last_name': 'Admin', 'role': Roles.ADMIN}
-                )
-                if admin_created:
-                    admin.set_password("admin123") 
-                    admin.is_staff = 1
-                    admin.save()
-                    self.stdout.write(self.style.SUCCESS(f'Created admin user: {admin.username}'))
-                    
-                # 1. Create or get host users
-                host1, host1_created = Users.objects.get_or_create(
-                    username='lifeisshort',
-                    email='lifeisshort@gmail.com',
-                    defaults={
-                        'first_name': 'Samuel', 'last_name': 'John', 
-                        'role': Roles.HOST, 'phone_number': '2348216723456'
-                    }
-                )
-                if host1_created:
-                    host1.set_password("1mm@tu@l") 
-                    host1.save()
-                    self.stdout.write(self.style.SUCCESS(f'Created host 1 user: {host1.username}'))
-
-                host2, host2_created = Users.objects.get_or_create(
-                    username='sani_bil',
-                    email='sani_bil@gmail.com',
-                    defaults={
-                        'first_name': 'Bilal', 'last_name': 'Sanni', 
-                        'role': Roles.HOST, 'phone_number': '2348216723456'
-                        }
+                # 1. Create admin, host and guest users that do not exist yet.
+                # A single lookup both answers the existence check and gives us
+                # the primary keys of the users that are already there.
+                users = Users.objects.in_bulk(
+                    [data['username'] for data in users_data], field_name='username'
                 )
-                if host2_created:
-                    host2.set_password("n@g0d3")
-                    host2.save()
-                    self.stdout.write(self.style.SUCCESS(f'Created host 2 user: {host2.username}'))
-
-                # 2. Create or get guest users
-                guest1, guest1_created = Users.objects.get_or_create(
-                    username='abu_yinuz',
-                    email='abu_yinuz@gmail.com',
-                    defaults={'first_name': 'Abubakar', 'last_name': 'Yinuz', 'role': Roles.GUEST}
-                )
-                if guest1_created:
-                    guest1.set_password('t3lisc0pe')
-                    guest1.save()
-                    self.stdout.write(self.style.SUCCESS(f'Created guest 1 user: {guest1.username}'))
-
-                guest2, guest2_created = Users.objects.get_or_create(
-                    username='akpan_dan',
-                    email='akpan_dan@gmail.com',
-                    defaults={'first_name': 'Dan', 'last_name': 'Akpan', 'role': Roles.GUEST}
-                )
-                if guest2_created:
-                    guest2.set_password('runn1ng_h0rse')
-                    guest2.save()
-                    self.stdout.write(self.style.SUCCESS(f'Created guest 2 user: {guest2.username}'))
-                    
-                guest3, guest3_created = Users.objects.get_or_create(
-                    username='ken.willy',
-                    email='ken.willy@gmail.com',
-                    defaults={'first_name': 'Ken', 'last_name': 'Williams', 'role': Roles.GUEST}
-                )
-                if guest3_created:
-                    guest3.set_password('Rumin@nt')
-                    guest3.save()
-                    self.stdout.write(self.style.SUCCESS(f'Created guest 3 user: {guest3.username}'))
+                # bulk_create() bypasses set_password(), so hash the shared
+                # seed password once and reuse the encoded value.
+                missing_users = [data for data in users_data if data['username'] not in users]
+                password = make_password(SEED_PASSWORD) if missing_users else None
+                users_to_create = [
+                    Users(user_id=user_id, password=password, **data)
+                    for user_id, data in zip(uuid4_batch(len(missing_users)), missing_users)
+                ]
+                Users.objects.bulk_create(users_to_create, batch_size=BATCH_SIZE)
+                users.update((user.username, user) for user in users_to_create)
+                self.stdout.write(self.style.SUCCESS(
+                    f'Created {len(users_to_create)} users ({len(users) - len(users_to_create)} already existed).'
+                ))
 
+                host1, host2 = users['lifeisshort'], users['sani_bil']
+                guest1, guest2, guest3 = users['abu_yinuz'], users['akpan_dan'], users['ken.willy']
 
-                # 3. Create Sample Listings
+                # 2. Create Sample Listings
                 listings_data = [
                     {
                         'host': host1,
@@ -103,7 +107,7 @@ class Command(BaseCommand):
                         'location': 'block 2A, Dimple Close, Ikoyi - Lagos',
                         'price_per_night': Decimal('451.00'),
                         'amenities': [
-                            (AMENITIES.WI_FI, 1), (AMENITIES.POOL, 1), (AMENITIES.PETS, 1)
+                            (AmenityType.WI_FI, 1), (AmenityType.POOL, 1), (AmenityType.PETS, 1)
                         ],
                         'watchlist': [guest1, guest2]
                     },
@@ -114,7 +118,7 @@ class Command(BaseCommand):
                         'location': 'Victoria Island, Lagos',
                         'price_per_night': Decimal('150.00'),
                         'amenities': [
-                            (AMENITIES.WI_FI, 1), (AMENITIES.PARKING, 2), (AMENITIES.POOL, 1)
+                            (AmenityType.WI_FI, 1), (AmenityType.PARKING, 2), (AmenityType.POOL, 1)
                         ],
                         'watchlist': [guest2]
                     },
@@ -125,7 +129,7 @@ class Command(BaseCommand):
                         'location': 'Eko Atlantic, Lagos',
                         'price_per_night': Decimal('300.00'),
                         'amenities': [
-                            (AMENITIES.WI_FI, 1), (AMENITIES.POOL, 1), (AMENITIES.GYM, 1)
+                            (AmenityType.WI_FI, 1), (AmenityType.POOL, 1), (AmenityType.GYM, 1)
                         ],
                         'watchlist': [guest3, guest2]
                     },
@@ -136,41 +140,63 @@ class Command(BaseCommand):
                         'location': '82, Opebi Ikeja, Lagos.',
                         'price_per_night': Decimal('551.00'),
                         'amenities': [
-                            (AMENITIES.PARKING, 1), (AMENITIES.PETS, 1)
+                            (AmenityType.PARKING, 1), (AmenityType.PETS, 1)
                         ],
                         'watchlist': []
                     }
                 ]
 
+                # Listings have no unique constraint, so look up the existing
+                # (host, title) pairs rather than relying on ignore_conflicts.
+                existing_listings = set(
+                    Listing.objects.filter(
+                        host__in=[host1, host2],
+                        title__in=[data['title'] for data in listings_data],
+                    ).values_list('host_id', 'title')
+                )
+
+                # Pre-generate primary keys for every listing and amenity row.
+                new_ids = iter(uuid4_batch(
+                    len(listings_data) + sum(len(data['amenities']) for data in listings_data)
+                ))
+                listings_to_create = []
+                features_to_create = []
+                watchlist_rows = []
                 for data in listings_data:
-                    listing, created = Listing.objects.get_or_create(
+                    if (data['host'].pk, data['title']) in existing_listings:
+                        continue
+
+                    listing = Listing(
+                        listing_id=next(new_ids),
                         host=data['host'],
                         title=data['title'],
-                        defaults={
-                            'description': data['description'],
-                            'location': data['location'],
-                            'price_per_night': data['price_per_night'],
-                            'is_available': True
-                        }
+                        description=data['description'],
+                        location=data['location'],
+                        price_per_night=data['price_per_night'],
+                        is_available=True,
+                    )
+                    listings_to_create.append(listing)
+                    features_to_create.extend(
+                        PropertyFeature(amenity_id=next(new_ids), listing=listing, name=amenity_name, qty=qty)
+                        for amenity_name, qty in data['amenities']
+                    )
+                    watchlist_rows.extend(
+                        Watchlist(listing_id=listing.pk, users_id=user.pk)
+                        for user in data['watchlist']
                     )
-                    if created:
-                        self.stdout.write(self.style.SUCCESS(f'Created listing: "{listing.title}"'))
-
-                        # Add amenities
-                        for amenity_name, qty in data['amenities']:
-                            PropertyFeature.objects.get_or_create(
-                                listing=listing,
-                                name=amenity_name,
-                                defaults={'qty': qty}
-                            )
-                            self.stdout.write(self.style.SUCCESS(f'  - Added amenity: {amenity_name}'))
-
-                        # Add to watchlist
-                        if data['watchlist']:
-                            listing.watchlist.add(*data['watchlist'])
-                            self.stdout.write(self.style.SUCCESS(f' - Added to watchlist for {len(data["watchlist"])} users.'))
-                    else:
-                        self.stdout.write(self.style.WARNING(f'Listing "{listing.title}" already exists. Skipping.'))
+
+                Listing.objects.bulk_create(listings_to_create, batch_size=BATCH_SIZE)
+                PropertyFeature.objects.bulk_create(features_to_create, batch_size=BATCH_SIZE)
+                Watchlist.objects.bulk_create(
+                    watchlist_rows, ignore_conflicts=True, batch_size=WATCHLIST_BATCH_SIZE
+                )
+
+                self.stdout.write(self.style.SUCCESS(f'Created {len(listings_to_create)} listings.'))
+                skipped = len(listings_data) - len(listings_to_create)
+                if skipped:
+                    self.stdout.write(self.style.WARNING(f'Skipped {skipped} listings that already exist.'))
+                self.stdout.write(self.style.SUCCESS(f'Added {len(features_to_create)} amenities.'))
+                self.stdout.write(self.style.SUCCESS(f'Added {len(watchlist_rows)} watchlist entries.'))
 
             self.stdout.write(self.style.SUCCESS('Database population for listings completed successfully!'))
 
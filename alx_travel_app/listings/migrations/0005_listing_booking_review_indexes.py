@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-15 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0004_alter_payment_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['host', 'is_available'], name='listing_host_available_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', 'status'], name='booking_listing_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['listing', 'rating'], name='review_listing_rating_idx'),
+        ),
+    ]
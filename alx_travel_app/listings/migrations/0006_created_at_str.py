@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-15 10:00
+
+from django.db import migrations
+import listings.fields
+
+
+MODELS = ['users', 'listing', 'propertyfeature', 'booking', 'review']
+
+
+def backfill_created_at_str(apps, schema_editor):
+    for model_name in MODELS:
+        model = apps.get_model('listings', model_name)
+        rows = list(model.objects.filter(created_at_str__isnull=True).only('pk', 'created_at'))
+        for row in rows:
+            row.created_at_str = listings.fields.format_timestamp(row.created_at)
+        model.objects.bulk_update(rows, ['created_at_str'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0005_listing_booking_review_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name='created_at_str',
+                field=listings.fields.FormattedTimestampField(source='created_at'),
+            )
+            for model_name in MODELS
+        ],
+        migrations.RunPython(backfill_created_at_str, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-15 11:00
+
+from django.db import migrations, models
+from django.db.models import Avg, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Round
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Review = apps.get_model('listings', 'Review')
+    reviews = Review.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    Listing.objects.update(
+        avg_rating=Subquery(reviews.annotate(value=Round(Avg('rating'), 1)).values('value')),
+        review_count=Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0006_created_at_str'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='avg_rating',
+            field=models.DecimalField(blank=True, decimal_places=1, editable=False, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
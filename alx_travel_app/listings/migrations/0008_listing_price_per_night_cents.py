@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-15 12:00
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+import listings.fields
+
+
+def backfill_price_per_night_cents(apps, schema_editor):
+    Listing = apps.get_model('listings', 'Listing')
+    Listing.objects.update(
+        price_per_night_cents=Cast(Round(F('price_per_night') * 100), models.BigIntegerField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0007_listing_avg_rating_review_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='listing',
+            name='price_per_night_cents',
+            field=listings.fields.CentsField(default=0, source='price_per_night'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_price_per_night_cents, migrations.RunPython.noop),
+    ]
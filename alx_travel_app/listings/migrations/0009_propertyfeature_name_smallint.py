@@ -0,0 +1,54 @@
+# Generated by Django 5.2.4 on 2026-10-15 13:00
+
+from django.db import migrations, models
+
+
+AMENITY_TYPES = {'WI-FI': 1, 'POOL': 2, 'PETS': 3, 'GYM': 4, 'PARKING': 5}
+AMENITY_TYPE_CHOICES = [(1, 'wi-fi'), (2, 'Swimming Pool'), (3, 'Pets Allowed'), (4, 'Gym'), (5, 'Parking')]
+
+
+def codes_to_types(apps, schema_editor):
+    PropertyFeature = apps.get_model('listings', 'PropertyFeature')
+    for code, value in AMENITY_TYPES.items():
+        PropertyFeature.objects.filter(name=code).update(amenity_type=value)
+
+
+def types_to_codes(apps, schema_editor):
+    PropertyFeature = apps.get_model('listings', 'PropertyFeature')
+    for code, value in AMENITY_TYPES.items():
+        PropertyFeature.objects.filter(amenity_type=value).update(name=code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0008_listing_price_per_night_cents'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='propertyfeature',
+            name='amenity_type',
+            field=models.PositiveSmallIntegerField(choices=AMENITY_TYPE_CHOICES, null=True),
+        ),
+        migrations.AlterField(
+            model_name='propertyfeature',
+            name='name',
+            field=models.CharField(choices=[('WI-FI', 'wi-fi'), ('POOL', 'Swimming Pool'), ('PETS', 'Pets Allowed'), ('GYM', 'Gym'), ('PARKING', 'Parking')], max_length=10, null=True),
+        ),
+        migrations.RunPython(codes_to_types, types_to_codes),
+        migrations.RemoveField(
+            model_name='propertyfeature',
+            name='name',
+        ),
+        migrations.RenameField(
+            model_name='propertyfeature',
+            old_name='amenity_type',
+            new_name='name',
+        ),
+        migrations.AlterField(
+            model_name='propertyfeature',
+            name='name',
+            field=models.PositiveSmallIntegerField(choices=AMENITY_TYPE_CHOICES),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-15 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('listings', '0009_propertyfeature_name_smallint'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['guest', 'status'], name='booking_guest_status_idx'),
+        ),
+    ]
@@ -1,19 +1,26 @@
 from django.db import models
-from .enums import Roles, BookingStatus, AMENITIES, PaymentStatus 
-from django.db.models import CheckConstraint, Q, F
+from .enums import (
+    Roles, BookingStatus, ROLE_CHOICES, BOOKING_STATUS_CHOICES, AMENITY_TYPE_CHOICES, AMENITY_CODES,
+    PAYMENT_STATUS_CHOICES,
+)
+from django.db.models import CheckConstraint, Q, F, Avg, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Round
 from django.contrib.auth.models import AbstractUser
+from functools import cached_property
+from .fields import CentsField, FormattedTimestampField, format_timestamp
 import uuid
 
 
 class Users(AbstractUser):
     user_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, null=False)
-    role = models.CharField(max_length=10, null=False, choices=Roles.choices, default=Roles.GUEST)
+    role = models.CharField(max_length=10, null=False, choices=ROLE_CHOICES, default=Roles.GUEST)
     first_name = models.CharField(max_length=150, blank=True)
     last_name = models.CharField(max_length=150, blank=True)  
     email = models.EmailField(unique=True, null=False)
     password = models.CharField(max_length=128, null=False)  
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    created_at_str = FormattedTimestampField(source='created_at')
 
     REQUIRED_FIELDS = ['email', 'first_name', 'last_name']
 
@@ -26,9 +33,22 @@ class Users(AbstractUser):
             return f"{self.first_name} {self.last_name}".strip()
         return "No name"
     
-    @property
+    @cached_property
     def formatted_created_at(self):
-        return self.created_at.strftime("%b %d, %Y, %H:%M %p").replace("AM", "a.m.").replace("PM", "p.m.")
+        return self.created_at_str or format_timestamp(self.created_at)
+
+
+def rating_summary():
+    """
+    Update expressions recomputing a listing's `avg_rating` (rounded to one
+    decimal place) and `review_count` from its reviews, for use in
+    `Listing.objects.filter(...).update(**rating_summary())`.
+    """
+    reviews = Review.objects.filter(listing=OuterRef('pk')).order_by().values('listing')
+    return {
+        'avg_rating': Subquery(reviews.annotate(value=Round(Avg('rating'), 1)).values('value')),
+        'review_count': Coalesce(Subquery(reviews.annotate(value=Count('pk')).values('value')), 0),
+    }
 
 
 class Listing(models.Model):
@@ -38,32 +58,58 @@ class Listing(models.Model):
     description = models.TextField()
     location = models.CharField(max_length=100)
     price_per_night = models.DecimalField(max_digits=8, decimal_places=2)
+    price_per_night_cents = CentsField(source='price_per_night')
     is_available = models.BooleanField(default=True)
     watchlist = models.ManyToManyField(Users, blank=True, related_name='likes')
+    # Denormalized from the listing's reviews, see `rating_summary`
+    avg_rating = models.DecimalField(max_digits=3, decimal_places=1, null=True, blank=True, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    created_at_str = FormattedTimestampField(source='created_at')
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['host', 'is_available'], name='listing_host_available_idx'),
+        ]
+
     def __str__(self):
-        return f"{self.title} listed by: {self.host_id.full_name}"
+        return f"{self.title} listed by: {self.host.full_name}"
 
-    @property
+    @cached_property
     def formatted_created_at(self):
-        return self.created_at.strftime("%b %d, %Y, %H:%M %p").replace("AM", "a.m.").replace("PM", "p.m.")
+        return self.created_at_str or format_timestamp(self.created_at)
+
+    @cached_property
+    def features(self):
+        """
+        Codes of the amenities associated with the listing.
+        """
+        return [AMENITY_CODES[amenity.name] for amenity in self.amenity.all()]
+
+    @cached_property
+    def interested_clients(self):
+        """
+        Full names of the users who have added the listing to their watchlist.
+        """
+        return [user.full_name for user in self.watchlist.all()]
 
 
 class PropertyFeature(models.Model):
     amenity_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, null=False)
     listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='amenity')
-    name= models.CharField(max_length=10, null=False, choices=AMENITIES.choices)
+    # An AmenityType; see AMENITY_CODES for the code shown by the API
+    name = models.PositiveSmallIntegerField(null=False, choices=AMENITY_TYPE_CHOICES)
     qty = models.IntegerField(null=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    created_at_str = FormattedTimestampField(source='created_at')
     
     def __str__(self):
-        return self.name
+        return AMENITY_CODES[self.name]
     
-    @property
+    @cached_property
     def formatted_created_at(self):
-        return self.created_at.strftime("%b %d, %Y, %H:%M %p").replace("AM", "a.m.").replace("PM", "p.m.")
+        return self.created_at_str or format_timestamp(self.created_at)
 
 
 class Booking(models.Model):
@@ -73,8 +119,9 @@ class Booking(models.Model):
     start_date = models.DateField()
     end_date = models.DateField()
     total_price = models.DecimalField(max_digits=15, decimal_places=2,  null=True)
-    status = models.CharField(max_length=10, null=False, choices=BookingStatus.choices, default=BookingStatus.PENDING) 
+    status = models.CharField(max_length=10, null=False, choices=BOOKING_STATUS_CHOICES, default=BookingStatus.PENDING) 
     created_at = models.DateTimeField(auto_now_add=True)
+    created_at_str = FormattedTimestampField(source='created_at')
     
     class Meta:
         constraints = [
@@ -83,13 +130,17 @@ class Booking(models.Model):
                 name = 'check_start_date',
             ),
         ]
+        indexes = [
+            models.Index(fields=['listing', 'status'], name='booking_listing_status_idx'),
+            models.Index(fields=['guest', 'status'], name='booking_guest_status_idx'),
+        ]
 
     def __str__(self):
         return f'{self.guest.full_name} booked for {self.listing.title}'
     
-    @property
+    @cached_property
     def formatted_created_at(self):
-        return self.created_at.strftime("%b %d, %Y, %H:%M %p").replace("AM", "a.m.").replace("PM", "p.m.")
+        return self.created_at_str or format_timestamp(self.created_at)
 
 
 class Review(models.Model):
@@ -99,6 +150,7 @@ class Review(models.Model):
     rating = models.IntegerField()
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    created_at_str = FormattedTimestampField(source='created_at')
     
     class Meta:
             constraints = [
@@ -107,13 +159,16 @@ class Review(models.Model):
                     name='rating_range_check',
                 ),
             ]
+            indexes = [
+                models.Index(fields=['listing', 'rating'], name='review_listing_rating_idx'),
+            ]
     
     def __str__(self):
         return f'{self.reviewer.full_name}, rating: {self.rating} out of 5'
     
-    @property
+    @cached_property
     def formatted_created_at(self):
-        return self.created_at.strftime("%b %d, %Y, %H:%M %p").replace("AM", "a.m.").replace("PM", "p.m.")   
+        return self.created_at_str or format_timestamp(self.created_at)
 
 
 class Payment(models.Model):
@@ -123,7 +178,7 @@ class Payment(models.Model):
     
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    status = models.CharField(max_length=20, choices=PaymentStatus.choices, default='pending')
+    status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending')
     trnx_id = models.CharField(max_length=200, unique=True, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -1,18 +1,370 @@
-# airbnb_app/serializers.py
+# listings/serializers.py
 
+from bisect import bisect_left
+from collections.abc import Mapping
 from decimal import Decimal
+from functools import cached_property, lru_cache
+from itertools import accumulate
+from keyword import iskeyword
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.utils import timezone
+from django.db import models
+from django.db.models import Prefetch
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
 from .models import Users, Listing, PropertyFeature, Booking, Review, Payment
-from .enums import Roles, BookingStatus, AMENITIES, PaymentStatus
+from .enums import BookingStatus, PaymentStatus, AMENITY_CHOICES, AMENITY_TYPES, AMENITY_CODES
 
 
-class UserSerializer(serializers.ModelSerializer):
+class LeanPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField that only selects the primary key (plus any
+    `only_fields`) when resolving the related instance, instead of the
+    whole row. Other columns are loaded lazily if they are ever accessed.
+    """
+    def __init__(self, only_fields=(), **kwargs):
+        self.only_fields = tuple(only_fields)
+        super().__init__(**kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.only(queryset.model._meta.pk.name, *self.only_fields)
+
+    def parse_pk(self, data):
+        """
+        Returns `data` as a primary key value, or None if it is not one.
+        """
+        try:
+            return self.queryset.model._meta.pk.to_python(data)
+        except (TypeError, ValueError, DjangoValidationError):
+            return None
+
+    def to_internal_value(self, data):
+        # Instances resolved up front for a whole batch (see BookingListSerializer)
+        preloaded = self.context.get('preloaded_instances', {}).get(self.field_name)
+        if preloaded:
+            pk = self.parse_pk(data)
+            if pk in preloaded:
+                return preloaded[pk]
+        return super().to_internal_value(data)
+
+
+class AmenityCodeField(serializers.ChoiceField):
+    """
+    Exposes a stored `AmenityType` integer as its `AMENITIES` code.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(choices=AMENITY_CHOICES, **kwargs)
+
+    def to_internal_value(self, data):
+        return AMENITY_TYPES[super().to_internal_value(data)]
+
+    def to_representation(self, value):
+        return AMENITY_CODES[value]
+
+
+class SerializerCacheMixin:
+    """
+    Reuses the representation of an instance that appears more than once in
+    a response (e.g. the same host on several listings).
+
+    The cache is kept on the root serializer, so it lives for a single
+    response. This relies on the serializer's fields not changing between
+    instances, which holds for every serializer in this module.
+    """
+    def to_representation(self, instance):
+        pk = getattr(instance, 'pk', None)
+        if pk is None:
+            return super().to_representation(instance)
+
+        cache = self.root.__dict__.setdefault('_representation_cache', {})
+        key = (type(self), pk)
+        if key not in cache:
+            cache[key] = super().to_representation(instance)
+        return cache[key]
+
+
+@lru_cache(maxsize=None)
+def representation_factory(signature):
+    """
+    Compiles a factory for a straight-line `to_representation(instance)`
+    specialized to `signature`, a tuple of `(field_name, source_attrs,
+    convert)` entries. The factory takes one `to_representation` callable
+    per converted field, in order, and returns the function.
+
+    Names are validated identifiers and field names are embedded with
+    `repr()`, so the generated source is never built from arbitrary text.
+    """
+    params, lines, items = [], [], []
+    for i, (field_name, source_attrs, convert) in enumerate(signature):
+        lines.append(f"        v{i} = instance.{'.'.join(source_attrs)}")
+        if convert:
+            params.append(f'r{i}')
+            items.append(f"{field_name!r}: None if v{i} is None else r{i}(v{i}),")
+        else:
+            items.append(f"{field_name!r}: v{i},")
+
+    source = '\n'.join([
+        f"def factory({', '.join(params)}):",
+        "    def to_representation(instance):",
+        *lines,
+        "        return {",
+        *(f"            {item}" for item in items),
+        "        }",
+        "    return to_representation",
+    ])
+    namespace = {}
+    exec(compile(source, f'<representation {len(signature)} fields>', 'exec'), namespace)
+    return namespace['factory']
+
+
+class FastSerializationMixin:
+    """
+    Serializes flat serializers (model attributes and properties, possibly
+    through non-null foreign keys) with a `to_representation` generated for
+    the serializer's exact field list, skipping DRF's generic per-field
+    attribute lookup and dispatch for every row. Serializers with any
+    nested, relational, method or callable-source field use the regular path,
+    as does anything that is not a model instance (e.g. `validated_data`).
+    """
+    @cached_property
+    def _fast_to_representation(self):
+        signature, converters = [], []
+        for field in self._readable_fields:
+            if isinstance(field, (serializers.BaseSerializer, serializers.RelatedField,
+                                  serializers.ManyRelatedField, serializers.SerializerMethodField)):
+                return None
+            source_attrs = self._fast_source_attrs(field)
+            if source_attrs is None:
+                return None
+            # ReadOnlyField passes values through unchanged
+            convert = not isinstance(field, serializers.ReadOnlyField)
+            signature.append((field.field_name, source_attrs, convert))
+            if convert:
+                converters.append(field.to_representation)
+        return representation_factory(tuple(signature))(*converters)
+
+    def _fast_source_attrs(self, field):
+        """
+        Returns the field's `source_attrs` as a tuple if they can be read with
+        plain attribute access: identifiers, every step but the last a
+        non-null foreign key (so it is never None), and no callables.
+        """
+        source_attrs = tuple(field.source_attrs)
+        if not source_attrs or not all(attr.isidentifier() and not iskeyword(attr) for attr in source_attrs):
+            return None
+
+        model = self.Meta.model
+        for attr in source_attrs[:-1]:
+            try:
+                model_field = model._meta.get_field(attr)
+            except FieldDoesNotExist:
+                return None
+            if not (model_field.many_to_one and model_field.concrete and not model_field.null):
+                return None
+            model = model_field.related_model
+        if callable(getattr(model, source_attrs[-1], None)):
+            return None
+        return source_attrs
+
+    def to_representation(self, instance):
+        to_representation = self._fast_to_representation
+        if to_representation is None or isinstance(instance, Mapping) or not isinstance(instance, models.Model):
+            return super().to_representation(instance)
+        return to_representation(instance)
+
+
+class DynamicFieldsMixin:
+    """
+    Lets clients of read requests trim the response to the fields listed in
+    a comma-separated `?fields=` query parameter. Unknown names are ignored.
+    """
+    @staticmethod
+    def requested_fields(request):
+        """
+        Returns the set of field names asked for by `request`, or None when
+        the full representation should be rendered.
+        """
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        fields = request.query_params.get('fields')
+        if not fields:
+            return None
+        return {name.strip() for name in fields.split(',') if name.strip()}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.requested_fields(self.context.get('request'))
+        if requested is not None:
+            for field_name in set(self.fields) - requested:
+                self.fields.pop(field_name)
+
+
+@lru_cache(maxsize=None)
+def related_lookups(serializer_class):
+    """
+    Walks the fields of `serializer_class` and returns the
+    `(select_related, prefetch_related)` lookups needed to render it without
+    a query per instance. Nested serializers and dotted sources over forward
+    foreign keys are joined, reverse and many-to-many relations are
+    prefetched, and the relations of nested serializers are followed.
+    """
+    model = serializer_class.Meta.model
+    select, prefetch = [], []
+    for field in serializer_class().fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if isinstance(nested, serializers.BaseSerializer):
+            nested_select, nested_prefetch = eager_lookups(type(nested))
+        elif isinstance(field, serializers.ManyRelatedField) or len(field.source_attrs) > 1:
+            nested_select = nested_prefetch = ()
+        else:
+            # Primary key fields read the local key column
+            continue
+
+        name = model_field.name
+        if model_field.many_to_many or model_field.one_to_many:
+            prefetch.extend([f'{name}__{lookup}' for lookup in (*nested_select, *nested_prefetch)] or [name])
+        else:
+            select.append(name)
+            select.extend(f'{name}__{lookup}' for lookup in nested_select)
+            prefetch.extend(f'{name}__{lookup}' for lookup in nested_prefetch)
+    return tuple(dict.fromkeys(select)), tuple(dict.fromkeys(prefetch))
+
+
+def eager_lookups(serializer_class):
+    """
+    Returns the `(select_related, prefetch_related)` lookups of
+    `serializer_class`: the ones it declares, or else the ones derived from
+    its fields by `related_lookups`.
+    """
+    select = getattr(serializer_class, 'select_related_fields', None)
+    prefetch = getattr(serializer_class, 'prefetch_related_fields', None)
+    if select is None and prefetch is None:
+        return related_lookups(serializer_class)
+    return tuple(select or ()), tuple(prefetch or ())
+
+
+@lru_cache(maxsize=None)
+def serializer_columns(serializer_class, fields=None, select_related=()):
+    """
+    Returns the model columns read when rendering `fields` (a frozenset of
+    field names, None meaning all of them) with `serializer_class`, in the
+    form accepted by `QuerySet.only()`.
+
+    Nested serializers over the foreign keys in `select_related` contribute
+    their own columns under the relation's prefix. Other relations only
+    need their key column; reverse and many-to-many relations, which are
+    prefetched, need none. Fields that are not model fields (properties,
+    method fields) read the columns listed in the serializer's
+    `field_columns`.
+    """
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    field_columns = getattr(serializer_class, 'field_columns', {})
+
+    columns = [model._meta.pk.name]
+    for field in serializer.fields.values():
+        if field.write_only or (fields is not None and field.field_name not in fields):
+            continue
+        columns.extend(field_columns.get(field.field_name, ()))
+        if field.source == '*':
+            continue
+        try:
+            model_field = model._meta.get_field(field.source_attrs[0])
+        except FieldDoesNotExist:
+            continue
+        if not model_field.concrete or model_field.many_to_many:
+            continue
+
+        columns.append(model_field.name)
+        if isinstance(field, serializers.BaseSerializer) and model_field.name in select_related:
+            nested = type(field)
+            columns.extend(
+                f'{model_field.name}__{column}'
+                for column in serializer_columns(nested, None, eager_lookups(nested)[0])
+            )
+    return tuple(dict.fromkeys(columns))
+
+
+class EagerLoadingMixin:
+    """
+    Lets a serializer declare the relations it reads, so views can load
+    them up front with `setup_eager_loading(queryset)`, and the columns it
+    reads, with `only_fields()`.
+
+    The relations default to those found by walking the serializer's
+    fields (`related_lookups`); declare `select_related_fields` and
+    `prefetch_related_fields` to override them, e.g. with `Prefetch` objects.
+    `eager_loading_fields` maps a relation to the response fields that read
+    it, for relations that are used by fields with another name.
+    `field_columns` maps fields that are not model fields to the columns
+    they read.
+    """
+    select_related_fields = None
+    prefetch_related_fields = None
+    eager_loading_fields = {}
+    field_columns = {}
+
+    @classmethod
+    def only_fields(cls, fields=None):
+        """
+        Returns the columns (including those of the `select_related_fields`
+        joins) needed to render `fields`, None meaning all of them.
+        """
+        select_related = tuple(
+            lookup for lookup in eager_lookups(cls)[0] if cls.needs_relation(lookup, fields)
+        )
+        return serializer_columns(cls, None if fields is None else frozenset(fields), select_related)
+
+    @classmethod
+    def needs_relation(cls, relation, fields):
+        """
+        Returns whether any of the response `fields` (None meaning all of
+        them) reads `relation`.
+        """
+        if fields is None:
+            return True
+        return not fields.isdisjoint(cls.eager_loading_fields.get(relation, (relation,)))
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """
+        Applies the joins and prefetches needed to serialize `queryset`
+        without issuing extra queries per instance. When `fields` is given,
+        relations that none of those fields read are skipped.
+        """
+        def lookup_root(lookup):
+            path = lookup.prefetch_to if isinstance(lookup, Prefetch) else lookup
+            return path.split('__')[0]
+
+        select_related, prefetch_related = eager_lookups(cls)
+        return queryset.select_related(*[
+            lookup for lookup in select_related
+            if cls.needs_relation(lookup_root(lookup), fields)
+        ]).prefetch_related(*[
+            lookup for lookup in prefetch_related
+            if cls.needs_relation(lookup_root(lookup), fields)
+        ])
+
+
+class UserSerializer(SerializerCacheMixin, FastSerializationMixin, serializers.ModelSerializer):
     """
     Serializer for the custom Users model.
     Handles user data representation, including custom properties.
     """
     full_name = serializers.ReadOnlyField()
-    formatted_created_at = serializers.ReadOnlyField()
+    formatted_created_at = serializers.CharField(source='created_at_str', read_only=True)
+
+    field_columns = {'full_name': ('first_name', 'last_name')}
 
     class Meta:
         model = Users
@@ -31,20 +383,37 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
     def update(self, instance, validated_data):
+        # Hash before the single save in ModelSerializer.update(), rather than
+        # saving the user twice
         password = validated_data.pop('password', None)
-        instance = super().update(instance, validated_data)
         if password:
             instance.set_password(password)
-            instance.save()
-        return instance
+        return super().update(instance, validated_data)
+
+
+class MinimalUserSerializer(SerializerCacheMixin, FastSerializationMixin, serializers.ModelSerializer):
+    """
+    Minimal representation of a user, for embedding in other resources
+    (listing watchers, booking guests).
+    """
+    full_name = serializers.ReadOnlyField()
+
+    field_columns = {'full_name': ('first_name', 'last_name')}
+
+    class Meta:
+        model = Users
+        fields = ['user_id', 'full_name']
+        read_only_fields = ['user_id', 'full_name']
 
 
-class PropertyFeatureSerializer(serializers.ModelSerializer):
+class PropertyFeatureSerializer(SerializerCacheMixin, FastSerializationMixin, serializers.ModelSerializer):
     """
     Serializer for the PropertyFeature model.
     Represents amenities associated with a listing.
     """
-    formatted_created_at = serializers.ReadOnlyField()
+    listing = LeanPrimaryKeyRelatedField(queryset=Listing.objects.all(), write_only=True)
+    name = AmenityCodeField()
+    formatted_created_at = serializers.CharField(source='created_at_str', read_only=True)
 
     class Meta:
         model = PropertyFeature
@@ -53,20 +422,18 @@ class PropertyFeatureSerializer(serializers.ModelSerializer):
             'created_at', 'formatted_created_at'
         ]
         read_only_fields = ['amenity_id', 'created_at', 'formatted_created_at']
-        
-        extra_kwargs = {
-            'listing': {'write_only': True}
-        }
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SerializerCacheMixin, FastSerializationMixin, serializers.ModelSerializer):
     """
     Serializer for the Review model.
     Handles review data, including rating validation.
     """
+    listing = LeanPrimaryKeyRelatedField(queryset=Listing.objects.all(), write_only=True)
+    reviewer = LeanPrimaryKeyRelatedField(queryset=Users.objects.all(), write_only=True)
     reviewer_full_name = serializers.ReadOnlyField(source='reviewer.full_name')
     listing_title = serializers.ReadOnlyField(source='listing.title')
-    formatted_created_at = serializers.ReadOnlyField()
+    formatted_created_at = serializers.CharField(source='created_at_str', read_only=True)
 
     class Meta:
         model = Review
@@ -79,11 +446,6 @@ class ReviewSerializer(serializers.ModelSerializer):
             'review_id', 'created_at', 'reviewer_full_name',
             'listing_title', 'formatted_created_at'
         ]
-        
-        extra_kwargs = {
-            'listing': {'write_only': True},
-            'reviewer': {'write_only': True} 
-        }
 
     def validate_rating(self, value):
         """
@@ -94,7 +456,19 @@ class ReviewSerializer(serializers.ModelSerializer):
         return value
 
 
-class ListingSerializer(serializers.ModelSerializer):
+class MinimalListingSerializer(SerializerCacheMixin, FastSerializationMixin, serializers.ModelSerializer):
+    """
+    Minimal representation of a listing, for embedding in other resources
+    (e.g. bookings) without its host, amenities, reviews and watchers.
+    """
+
+    class Meta:
+        model = Listing
+        fields = ['listing_id', 'title', 'price_per_night', 'location']
+        read_only_fields = fields
+
+
+class ListingSerializer(SerializerCacheMixin, DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Listing model.
     Provides a comprehensive view of a listing, including nested related data
@@ -103,53 +477,58 @@ class ListingSerializer(serializers.ModelSerializer):
     host = UserSerializer(read_only=True)
     amenity = PropertyFeatureSerializer(many=True, read_only=True) 
     reviews = ReviewSerializer(many=True, read_only=True)
-    watchlist = UserSerializer(many=True, read_only=True)
+    watchlist = MinimalUserSerializer(many=True, read_only=True)
 
-    formatted_created_at = serializers.ReadOnlyField() 
-    features = serializers.SerializerMethodField()
-    interested_clients = serializers.SerializerMethodField()
+    formatted_created_at = serializers.CharField(source='created_at_str', read_only=True)
+    features = serializers.ReadOnlyField()
+    interested_clients = serializers.ReadOnlyField()
     average_rating = serializers.SerializerMethodField()
 
+    select_related_fields = ['host']
+    prefetch_related_fields = [
+        'amenity',
+        # Reviewers are only rendered by full name
+        Prefetch('reviews__reviewer', queryset=Users.objects.only('user_id', 'first_name', 'last_name')),
+        # Watchers are only rendered by id and full name
+        Prefetch('watchlist', queryset=Users.objects.only('user_id', 'first_name', 'last_name')),
+        'bookings',
+    ]
+    eager_loading_fields = {
+        'amenity': ('amenity', 'features'),
+        'watchlist': ('watchlist', 'interested_clients'),
+    }
+    field_columns = {'average_rating': ('avg_rating',)}
+
     class Meta:
         model = Listing
         fields = [
             'listing_id', 'host', 'title', 'description', 'location',
             'price_per_night', 'is_available', 'watchlist', 'created_at',
             'updated_at', 'amenity', 'reviews', 'bookings', # Fixed comma here
-            'formatted_created_at', 'features', 'interested_clients', 'average_rating'
+            'formatted_created_at', 'features', 'interested_clients', 'average_rating',
+            'review_count',
         ]
         read_only_fields = [
-            'listing_id', 'host', 'created_at', 'updated_at', 
+            'listing_id', 'host', 'created_at', 'updated_at', 'review_count',
         ]
-    
-
-    def get_features(self, obj):
-        """
-        Returns a list of amenity names associated with the listing.
-        """
-        return [amenity.name for amenity in obj.amenity.all()]
-
-    def get_interested_clients(self, obj):
-        """
-        Returns a list of full names of users who have added this listing to their watchlist.
-        """
-        return [user.full_name for user in obj.watchlist.all()]
 
     def get_average_rating(self, obj):
         """
-        Calculates and returns the average rating for the listing, rounded to one decimal place.
+        Returns the average rating for the listing, rounded to one decimal place.
         Returns "No Review" if there are no reviews.
+
+        Reads the `avg_rating` column kept up to date by the Review signals.
         """
-        reviews = obj.reviews.all()
-        if not reviews:
-            return "No Review"
-        return round(sum([r.rating for r in reviews]) / len(reviews), 1)
+        return float(obj.avg_rating) if obj.avg_rating is not None else "No Review"
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SerializerCacheMixin, serializers.ModelSerializer):
     """
     Serializer for the Payment model with custom validation and creation logic.
     """
+    # Only the status (updated in create()) and total price are needed
+    booking = LeanPrimaryKeyRelatedField(queryset=Booking.objects.all(), only_fields=('status', 'total_price'))
+
     class Meta:
         model = Payment
         fields = ['trnx_id', 'booking', 'amount', 'status', 'created_at', 'updated_at']
@@ -158,25 +537,18 @@ class PaymentSerializer(serializers.ModelSerializer):
     def validate(self, data):
         """
         Validates the incoming data for creating a new Payment.
-        Checks if the 'booking' exists and if the 'amount' is valid.
+        Checks if the 'amount' is valid; the 'booking' field already
+        resolves (or rejects) the booking.
         """
-        # Ensure the booking exists before trying to create a payment for it
-        try:
-            booking = Booking.objects.get(id=self.initial_data.get('booking'))
-        except Booking.DoesNotExist:
-            raise serializers.ValidationError("A payment must be associated with a valid booking.")
-
         # Ensure a payment amount is provided and is a positive value
         amount = data.get('amount')
         if amount is None or amount <= 0:
             raise serializers.ValidationError("The payment amount must be a positive value.")
 
         # Optional: Add a check to ensure the amount matches the total_price of the booking
-        # if amount != booking.total_price:
+        # if amount != data['booking'].total_price:
         #     raise serializers.ValidationError("The payment amount must match the booking's total price.")
-        
-        # Add the booking instance to validated data for the create method
-        data['booking'] = booking
+
         return data
 
     def create(self, validated_data):
@@ -197,25 +569,99 @@ class PaymentSerializer(serializers.ModelSerializer):
         # Update the associated booking's status to confirmed
         if booking.status != BookingStatus.CONFIRMED:
             booking.status = BookingStatus.CONFIRMED
-            booking.save()
+            booking.save(update_fields=['status'])
 
         return payment
 
 
-class BookingSerializer(serializers.ModelSerializer):
+# Booking statuses that hold a listing's dates
+ACTIVE_BOOKING_STATUSES = (BookingStatus.PENDING, BookingStatus.CONFIRMED)
+
+
+def load_booked_intervals(listing_ids, after):
+    """
+    Loads the active bookings of `listing_ids` that end after the date
+    `after`, in one query. Returns a dict mapping each listing id to a
+    `(start_dates, max_end_dates)` pair sorted by start date, where
+    `max_end_dates[i]` is the latest end date among the first i+1 bookings.
+    """
+    intervals = {listing_id: [] for listing_id in listing_ids}
+    for listing_id, start_date, end_date in Booking.objects.filter(
+        listing_id__in=listing_ids,
+        end_date__gt=after,
+        status__in=ACTIVE_BOOKING_STATUSES,
+    ).values_list('listing_id', 'start_date', 'end_date'):
+        intervals[listing_id].append((start_date, end_date))
+
+    index = {}
+    for listing_id, pairs in intervals.items():
+        pairs.sort()
+        index[listing_id] = (
+            [start for start, _ in pairs],
+            list(accumulate((end for _, end in pairs), max)),
+        )
+    return index
+
+
+class BookingListSerializer(serializers.ListSerializer):
+    """
+    Validates a batch of bookings (`BookingSerializer(data=[...], many=True)`)
+    against the existing bookings of every listing involved, loaded in one
+    query, and against each other. The listings and guests of the batch are
+    also resolved with one query each, instead of one per booking.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            preloaded = self.context.setdefault('preloaded_instances', {})
+            for field in self.child.fields.values():
+                if isinstance(field, LeanPrimaryKeyRelatedField) and not field.read_only:
+                    pks = {field.parse_pk(item.get(field.field_name)) for item in data if isinstance(item, dict)}
+                    pks.discard(None)
+                    # Unknown pks are left for the field validation to report
+                    preloaded[field.field_name] = field.get_queryset().in_bulk(pks)
+
+            booked = self.context.setdefault('bookings_by_listing', {})
+            booked.update(load_booked_intervals(
+                preloaded['listing'].keys() - booked.keys(), after=timezone.localdate(),
+            ))
+        return super().to_internal_value(data)
+
+    def validate(self, attrs):
+        stays_by_listing = {}
+        for item in attrs:
+            stays_by_listing.setdefault(item['listing'].pk, []).append((item['start_date'], item['end_date']))
+
+        for stays in stays_by_listing.values():
+            stays.sort()
+            for (_, previous_end), (start_date, _) in zip(stays, stays[1:]):
+                if start_date < previous_end:
+                    raise serializers.ValidationError("Bookings in this request overlap for the same listing.")
+        return attrs
+
+
+class BookingSerializer(SerializerCacheMixin, EagerLoadingMixin, serializers.ModelSerializer):
     """
     Serializer for the Booking model.
     Handles booking data, including date validation and nested listing/guest info.
     """
     # Nested serializers for read-only representation of related objects
-    listing_detail = serializers.ReadOnlyField() 
-    guest_detail = serializers.ReadOnlyField() 
+    listing_detail = MinimalListingSerializer(source='listing', read_only=True)
+    guest_detail = MinimalUserSerializer(source='guest', read_only=True)
 
     # Nested serializer to display payments associated with this booking
     payments = PaymentSerializer(many=True, read_only=True)
 
-    formatted_created_at = serializers.ReadOnlyField()
-    listing = serializers.PrimaryKeyRelatedField(queryset=Listing.objects.all())
+    formatted_created_at = serializers.CharField(source='created_at_str', read_only=True)
+    # The price computes total_price in create(); listing_detail reads the rest
+    listing = LeanPrimaryKeyRelatedField(
+        queryset=Listing.objects.all(),
+        only_fields=('price_per_night_cents', *MinimalListingSerializer.Meta.fields),
+    )
+    # guest_detail only reads the name
+    guest = LeanPrimaryKeyRelatedField(
+        queryset=Users.objects.all(),
+        only_fields=MinimalUserSerializer.field_columns['full_name'],
+    )
 
     class Meta:
         model = Booking
@@ -228,6 +674,7 @@ class BookingSerializer(serializers.ModelSerializer):
             'booking_id', 'created_at', 'formatted_created_at', 
             'total_price', 'status' 
         ]
+        list_serializer_class = BookingListSerializer
 
     def validate(self, data):
         """
@@ -242,16 +689,44 @@ class BookingSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("End date must be after start date.")
         
         # Check for overlapping bookings
-        if Booking.objects.filter(
-            listing=listing,
-            start_date__lt=end_date, 
-            end_date__gt=start_date,
-            status__in=['pending', 'confirmed']
-        ).exists():
+        if self.is_booked(listing, start_date, end_date):
             raise serializers.ValidationError("This listing is already booked for part or all of the selected dates.")
 
         return data
 
+    def is_booked(self, listing, start_date, end_date):
+        """
+        Returns whether an active booking of `listing`, other than the one
+        being updated, overlaps the stay.
+
+        The listing's upcoming bookings are loaded once and kept in the
+        serializer context, so validating several bookings for the same
+        listing costs one query plus a binary search per booking.
+        """
+        today = timezone.localdate()
+        if start_date < today or self.instance is not None:
+            # The cached index only covers bookings that end after today,
+            # and would include the booking being updated
+            overlapping = Booking.objects.filter(
+                listing=listing,
+                start_date__lt=end_date,
+                end_date__gt=start_date,
+                status__in=ACTIVE_BOOKING_STATUSES,
+            )
+            if self.instance is not None:
+                overlapping = overlapping.exclude(pk=self.instance.pk)
+            return overlapping.exists()
+
+        booked = self.context.setdefault('bookings_by_listing', {})
+        if listing.pk not in booked:
+            booked.update(load_booked_intervals([listing.pk], after=today))
+        starts, max_ends = booked[listing.pk]
+
+        # Bookings starting before end_date are starts[:i]; one of them
+        # overlaps iff the latest end date among them is after start_date.
+        i = bisect_left(starts, end_date)
+        return i > 0 and max_ends[i - 1] > start_date
+
     def create(self, validated_data):
         """
         Custom create method to calculate total_price and set initial status.
@@ -265,8 +740,9 @@ class BookingSerializer(serializers.ModelSerializer):
         if duration_days <= 0: 
             raise serializers.ValidationError("Booking duration must be at least one day.")
 
-        calculated_total_price = Decimal(duration_days) * listing.price_per_night
-        validated_data['total_price'] = calculated_total_price
+        # Integer cents arithmetic; a Decimal is only built for the stored value
+        total_cents = listing.price_per_night_cents * duration_days
+        validated_data['total_price'] = Decimal(total_cents).scaleb(-2)
         
         if 'status' not in validated_data:
             validated_data['status'] = BookingStatus.PENDING # Ensure this is from your enums
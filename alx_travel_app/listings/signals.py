@@ -0,0 +1,79 @@
+# listings/signals.py
+
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import ListingCache
+from .models import Users, Listing, PropertyFeature, Booking, Review, rating_summary
+
+
+@receiver([post_save, post_delete], sender=Listing)
+def invalidate_listing(sender, instance, **kwargs):
+    """
+    Drop the cached representation of a saved or deleted listing.
+    """
+    if not ListingCache.enabled():
+        return
+    ListingCache.invalidate([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=Review)
+def refresh_rating_summary(sender, instance, **kwargs):
+    """
+    Recompute the reviewed listing's `avg_rating` and `review_count` in a
+    single UPDATE. Registered before the cache invalidation below.
+    """
+    Listing.objects.filter(pk=instance.listing_id).update(**rating_summary())
+
+
+@receiver([post_save, post_delete], sender=PropertyFeature)
+@receiver([post_save, post_delete], sender=Review)
+@receiver([post_save, post_delete], sender=Booking)
+def invalidate_parent_listing(sender, instance, **kwargs):
+    """
+    Amenities, reviews (and the average rating) and booking ids are nested
+    in the listing representation.
+    """
+    # Skips loading `listing_id` when it is deferred (e.g. lean bookings)
+    if not ListingCache.enabled():
+        return
+    ListingCache.invalidate([instance.listing_id])
+
+
+@receiver(m2m_changed, sender=Listing.watchlist.through)
+def invalidate_watchlist(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Drop the listings whose watchlist changed, from either side of the relation.
+    """
+    if not ListingCache.enabled():
+        return
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            ListingCache.invalidate([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        ListingCache.invalidate(pk_set)
+    elif action == 'pre_clear':
+        ListingCache.invalidate(list(instance.likes.values_list('pk', flat=True)))
+
+
+@receiver(post_save, sender=Users)
+@receiver(pre_delete, sender=Users)
+def invalidate_user_listings(sender, instance, update_fields=None, **kwargs):
+    """
+    Users appear in listings as the host, as watchers and as reviewers.
+    """
+    # Skips the listing lookup below when there is nothing to invalidate
+    if not ListingCache.enabled():
+        return
+    # Logging in only touches last_login, which no listing shows
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    if kwargs.get('created'):
+        return
+
+    ListingCache.invalidate(list(
+        Listing.objects.filter(
+            Q(host=instance) | Q(watchlist=instance) | Q(reviews__reviewer=instance)
+        ).values_list('pk', flat=True).distinct()
+    ))
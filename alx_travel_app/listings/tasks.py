@@ -1,26 +1,124 @@
 # listings/tasks.py
 
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.mail import EmailMessage, get_connection
 from django.conf import settings
+from django.db import transaction
+from smtplib import SMTPException
+import logging
+import requests
 
+from . import chapa
+from .enums import BookingStatus, PaymentStatus
 from .models import Booking, Payment
 
-@shared_task
-def send_booking_confirmation_email(booking_id):
+logger = logging.getLogger(__name__)
+
+BOOKING_CONFIRMATION_SUBJECT = 'Booking Confirmed!'
+BOOKING_CONFIRMATION_MESSAGE = (
+    "Hello {guest.first_name},\n\n"
+    "Your booking for {listing.title} has been confirmed. We look forward to seeing you!\n\n"
+    "Details:\n"
+    "- Check-in: {booking.start_date}\n"
+    "- Check-out: {booking.end_date}\n"
+    "- Total Price: {booking.total_price}\n\n"
+    "Thanks,\n"
+    "Your Booking App Team"
+)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def send_booking_confirmation_emails(self, booking_ids):
     """
-    Celery task to send a booking confirmation email.
+    Celery task to send the confirmation emails of several bookings over a
+    single SMTP connection, instead of one connection per email.
+    Connection failures are retried.
     """
+    bookings = Booking.objects.filter(booking_id__in=booking_ids).select_related('guest', 'listing').only(
+        'booking_id', 'start_date', 'end_date', 'total_price', 'guest', 'listing',
+        'guest__first_name', 'guest__email', 'listing__title',
+    )
+    from_email = settings.DEFAULT_FROM_EMAIL
+    render_message = BOOKING_CONFIRMATION_MESSAGE.format
+    messages = [
+        EmailMessage(
+            BOOKING_CONFIRMATION_SUBJECT,
+            render_message(booking=booking, guest=booking.guest, listing=booking.listing),
+            from_email,
+            [booking.guest.email],
+        )
+        for booking in bookings
+    ]
+
+    missing = len(set(booking_ids)) - len(messages)
+    if missing:
+        logger.warning("%s of %s bookings not found. Cannot send their emails.", missing, len(set(booking_ids)))
+    if not messages:
+        return 0
+
     try:
-        booking = Booking.objects.get(id=booking_id)
-        subject = 'Booking Confirmed!'
-        message = f"Hello {booking.guest.first_name},\n\nYour booking for {booking.listing.title} has been confirmed. We look forward to seeing you!\n\nDetails:\n- Check-in: {booking.start_date}\n- Check-out: {booking.end_date}\n- Total Price: {booking.total_price}\n\nThanks,\nYour Booking App Team"
-        from_email = settings.DEFAULT_FROM_EMAIL
-        recipient_list = [booking.guest.email]
-
-        send_mail(subject, message, from_email, recipient_list)
-        print(f"Sent confirmation email for booking {booking_id}")
-    except Booking.DoesNotExist:
-        print(f"Booking {booking_id} not found. Cannot send email.")
-    except Exception as e:
-        print(f"Failed to send email for booking {booking_id}: {e}")
+        with get_connection() as connection:
+            sent = connection.send_messages(messages)
+    except (SMTPException, OSError) as e:
+        logger.exception("Failed to send booking confirmation emails")
+        raise self.retry(exc=e)
+    logger.info("Sent %s booking confirmation emails", sent)
+    return sent
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def verify_chapa_payment(self, tx_ref):
+    """
+    Celery task to verify a payment with Chapa and record the outcome on the
+    payment and its booking, emailing the guest once it is confirmed.
+    Connection errors, timeouts and Chapa server errors are retried; any
+    other error or unexpected response marks the payment as failed.
+    """
+    try:
+        response = chapa.verify_transaction(tx_ref)
+        response.raise_for_status()
+        response_data = chapa.response_json(response)
+    except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+            requests.exceptions.RetryError) as e:
+        raise self.retry(exc=e)
+    except requests.exceptions.HTTPError as e:
+        if e.response is None or e.response.status_code >= 500:
+            raise self.retry(exc=e)
+        # Chapa rejected the request; asking again will not change that
+        logger.warning("Chapa rejected verification of payment %s: %s", tx_ref, e)
+        response_data = {}
+    except requests.exceptions.RequestException as e:
+        logger.warning("Unreadable Chapa verification response for payment %s: %s", tx_ref, e)
+        response_data = {}
+
+    # Check the verification status
+    if not isinstance(response_data, dict):
+        response_data = {}
+    data = response_data.get('data')
+    chapa_status = data.get('status') if isinstance(data, dict) else None
+
+    try:
+        payment = Payment.objects.select_related('booking').get(trnx_id=tx_ref)
+    except Payment.DoesNotExist:
+        logger.warning("Payment %s not found. Cannot record verification.", tx_ref)
+        return None
+
+    # Use a database transaction to ensure atomicity
+    with transaction.atomic():
+        if chapa_status == "success":
+            # If successful, update payment and booking statuses
+            payment.status = PaymentStatus.COMPLETED
+            payment.save(update_fields=['status', 'updated_at'])
+
+            booking = payment.booking
+            booking.status = BookingStatus.CONFIRMED
+            booking.save(update_fields=['status'])
+
+            # Send confirmation email once the new statuses are committed
+            transaction.on_commit(lambda booking_id=booking.booking_id: send_booking_confirmation_emails.delay([booking_id]))
+        else:
+            payment.status = PaymentStatus.FAILED
+            payment.save(update_fields=['status', 'updated_at'])
+            logger.info("Payment %s verification failed: %s", tx_ref, response_data.get('message'))
+
+    return payment.status
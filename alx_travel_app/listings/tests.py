@@ -1,3 +1,506 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from smtplib import SMTPException
+from unittest import mock
+import uuid
 
-# Create your tests here.
+import orjson
+import requests
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.test import APITestCase
+
+from .enums import AMENITIES, AmenityType, BookingStatus, PaymentStatus
+from .cache import ListingCache
+from .models import Users, Listing, PropertyFeature, Booking, Review, Payment
+from .serializers import BookingSerializer, PropertyFeatureSerializer, ReviewSerializer
+from .tasks import send_booking_confirmation_emails, verify_chapa_payment
+
+
+class ListingFixturesMixin:
+    """
+    Creates a host, a guest and a listing of the host for each test.
+    """
+    def setUp(self):
+        super().setUp()
+        self.host = Users.objects.create_user(
+            username='host', email='host@example.com', password='pass', first_name='Hana', last_name='Host',
+        )
+        self.guest = Users.objects.create_user(
+            username='guest', email='guest@example.com', password='pass', first_name='Gil', last_name='Guest',
+        )
+        self.listing = Listing.objects.create(
+            host=self.host, title='Cabin', description='A cabin', location='Woods',
+            price_per_night=Decimal('100.00'),
+        )
+        self.today = timezone.localdate()
+
+    def make_booking(self, start, nights, status=BookingStatus.PENDING, guest=None):
+        start_date = self.today + timedelta(days=start)
+        return Booking.objects.create(
+            listing=self.listing, guest=guest or self.guest, start_date=start_date,
+            end_date=start_date + timedelta(days=nights), total_price=Decimal('100.00') * nights, status=status,
+        )
+
+
+class BookingConfirmationEmailTests(ListingFixturesMixin, TestCase):
+
+    def test_sends_one_email_per_booking(self):
+        booking = self.make_booking(1, 2)
+        result = send_booking_confirmation_emails.apply(args=[[booking.booking_id]])
+        self.assertEqual(result.get(), 1)
+
+    @mock.patch('listings.tasks.get_connection')
+    def test_retries_when_sending_fails(self, get_connection):
+        get_connection.return_value.__enter__.return_value.send_messages.side_effect = SMTPException('down')
+        booking = self.make_booking(1, 2)
+
+        result = send_booking_confirmation_emails.apply(args=[[booking.booking_id]])
+
+        # The first attempt plus max_retries retries, then the task fails
+        self.assertEqual(get_connection.call_count, send_booking_confirmation_emails.max_retries + 1)
+        self.assertEqual(result.state, 'FAILURE')
+
+
+class VerifyChapaPaymentTests(ListingFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.booking = self.make_booking(1, 2)
+        self.payment = Payment.objects.create(
+            booking=self.booking, amount=self.booking.total_price, status=PaymentStatus.PENDING, trnx_id='tx-1',
+        )
+
+    @staticmethod
+    def chapa_response(body, status_code=200):
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = orjson.dumps(body)
+        return response
+
+    def verify(self, **patch_kwargs):
+        with mock.patch('listings.chapa.verify_transaction', **patch_kwargs) as verify_transaction:
+            result = verify_chapa_payment.apply(args=['tx-1'])
+        self.payment.refresh_from_db()
+        return result, verify_transaction
+
+    def test_success_confirms_booking(self):
+        result, _ = self.verify(return_value=self.chapa_response({'data': {'status': 'success'}}))
+        self.assertEqual(result.get(), PaymentStatus.COMPLETED)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, BookingStatus.CONFIRMED)
+
+    def test_unexpected_body_fails_payment(self):
+        for body in ({'data': None}, {'data': 'oops'}, {}, [], None):
+            with self.subTest(body=body):
+                result, verify_transaction = self.verify(return_value=self.chapa_response(body))
+                self.assertEqual(result.get(), PaymentStatus.FAILED)
+                self.assertEqual(self.payment.status, PaymentStatus.FAILED)
+                self.assertEqual(verify_transaction.call_count, 1)
+
+    def test_client_error_fails_payment_without_retry(self):
+        result, verify_transaction = self.verify(return_value=self.chapa_response({'message': 'no'}, 404))
+        self.assertEqual(result.get(), PaymentStatus.FAILED)
+        self.assertEqual(verify_transaction.call_count, 1)
+
+    def test_server_and_connection_errors_retry(self):
+        for patch_kwargs in (
+            {'return_value': self.chapa_response({}, 503)},
+            {'side_effect': requests.exceptions.ConnectionError('down')},
+            {'side_effect': requests.exceptions.Timeout('slow')},
+        ):
+            with self.subTest(patch_kwargs=patch_kwargs):
+                result, verify_transaction = self.verify(**patch_kwargs)
+                self.assertEqual(result.state, 'FAILURE')
+                self.assertEqual(verify_transaction.call_count, verify_chapa_payment.max_retries + 1)
+                self.assertEqual(self.payment.status, PaymentStatus.PENDING)
+
+class FastSerializationTests(ListingFixturesMixin, TestCase):
+
+    @staticmethod
+    def stock_representation(serializer, instance):
+        # DRF's own Serializer.to_representation, bypassing the generated fast path
+        return serializers.Serializer.to_representation(serializer, instance)
+
+    def test_review_matches_stock_output(self):
+        review = Review.objects.create(listing=self.listing, reviewer=self.guest, rating=4, comment='Nice')
+        review = Review.objects.select_related('listing', 'reviewer').get(pk=review.pk)
+        serializer = ReviewSerializer(review)
+        self.assertIsNotNone(serializer._fast_to_representation)
+        self.assertEqual(serializer.data, self.stock_representation(serializer, review))
+
+    def test_property_feature_matches_stock_output(self):
+        feature = PropertyFeature.objects.get(
+            pk=PropertyFeature.objects.create(listing=self.listing, name=AmenityType.POOL, qty=1).pk
+        )
+        serializer = PropertyFeatureSerializer(feature)
+        self.assertIsNotNone(serializer._fast_to_representation)
+        self.assertEqual(serializer.data, self.stock_representation(serializer, feature))
+        self.assertEqual(serializer.data['name'], AMENITIES.POOL)
+
+    def test_review_validated_data_matches_stock_output(self):
+        serializer = ReviewSerializer(data={
+            'listing': str(self.listing.pk), 'reviewer': str(self.guest.pk), 'rating': 5, 'comment': 'Great',
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.data, self.stock_representation(serializer, serializer.validated_data))
+        self.assertEqual(serializer.data['reviewer_full_name'], self.guest.full_name)
+
+    def test_property_feature_validated_data_matches_stock_output(self):
+        serializer = PropertyFeatureSerializer(data={'listing': str(self.listing.pk), 'name': 'GYM', 'qty': 2})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.data, self.stock_representation(serializer, serializer.validated_data))
+        self.assertEqual(serializer.data['name'], 'GYM')
+
+
+class BookingCreateTests(ListingFixturesMixin, APITestCase):
+    url = '/api/bookings/'
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.guest)
+
+    def payload(self, start, nights):
+        start_date = self.today + timedelta(days=start)
+        return {
+            'listing': str(self.listing.pk), 'guest': str(self.guest.pk),
+            'start_date': start_date.isoformat(), 'end_date': (start_date + timedelta(days=nights)).isoformat(),
+        }
+
+    def test_create_loads_listing_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, self.payload(1, 2), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['total_price'], '200.00')
+        self.assertEqual(response.data['listing_detail']['title'], self.listing.title)
+        listing_selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT') and 'FROM "listings_listing"' in query['sql']
+        ]
+        self.assertEqual(len(listing_selects), 1, listing_selects)
+
+    def test_overlapping_stay_is_rejected(self):
+        self.make_booking(2, 3)
+        for start, nights in ((1, 2), (3, 1), (4, 3), (0, 10)):
+            with self.subTest(start=start, nights=nights):
+                response = self.client.post(self.url, self.payload(start, nights), format='json')
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_adjacent_stays_are_accepted(self):
+        self.make_booking(2, 3)
+        for start, nights in ((0, 2), (5, 2)):
+            with self.subTest(start=start, nights=nights):
+                response = self.client.post(self.url, self.payload(start, nights), format='json')
+                self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+    def test_update_may_overlap_its_own_dates(self):
+        booking = self.make_booking(2, 3)
+        response = self.client.put(f'{self.url}{booking.pk}/', self.payload(2, 4), format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        booking.refresh_from_db()
+        self.assertEqual(booking.end_date, self.today + timedelta(days=6))
+
+    def test_update_overlapping_another_booking_is_rejected(self):
+        booking = self.make_booking(2, 3)
+        self.make_booking(6, 2, guest=self.host)
+        response = self.client.put(f'{self.url}{booking.pk}/', self.payload(2, 5), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_inactive_bookings_do_not_block(self):
+        self.make_booking(2, 3, status=BookingStatus.CANCELED)
+        response = self.client.post(self.url, self.payload(2, 3), format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+
+
+class BookingBatchValidationTests(ListingFixturesMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other_listing = Listing.objects.create(
+            host=self.host, title='Loft', description='A loft', location='City', price_per_night=Decimal('80.00'),
+        )
+
+    def item(self, start, nights, listing=None):
+        start_date = self.today + timedelta(days=start)
+        return {
+            'listing': str((listing or self.listing).pk), 'guest': str(self.guest.pk),
+            'start_date': start_date.isoformat(), 'end_date': (start_date + timedelta(days=nights)).isoformat(),
+        }
+
+    def test_batch_resolves_related_rows_once(self):
+        self.make_booking(10, 2)
+        data = [self.item(start, 1, listing) for start in range(5) for listing in (self.listing, self.other_listing)]
+        serializer = BookingSerializer(data=data, many=True)
+        # Listings, guests and existing bookings, whatever the batch size
+        with self.assertNumQueries(3):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data[1]['listing'], self.other_listing)
+
+    def test_adjacent_stays_in_batch_are_accepted(self):
+        data = [self.item(1, 2), self.item(3, 2), self.item(1, 2, self.other_listing)]
+        serializer = BookingSerializer(data=data, many=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_overlapping_stays_in_batch_are_rejected(self):
+        serializer = BookingSerializer(data=[self.item(3, 2), self.item(1, 3)], many=True)
+        self.assertFalse(serializer.is_valid())
+
+    def test_stay_overlapping_existing_booking_is_rejected(self):
+        self.make_booking(2, 3)
+        serializer = BookingSerializer(data=[self.item(0, 2), self.item(4, 1)], many=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0], {})
+        self.assertIn('non_field_errors', serializer.errors[1])
+
+    def test_unknown_listing_is_reported(self):
+        item = self.item(1, 2)
+        item['listing'] = str(uuid.uuid4())
+        serializer = BookingSerializer(data=[item], many=True)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('listing', serializer.errors[0])
+
+
+class ListingQueryTests(ListingFixturesMixin, APITestCase):
+
+    def test_retrieve_selects_only_rendered_user_columns(self):
+        Review.objects.create(listing=self.listing, reviewer=self.guest, rating=5, comment='Great')
+        self.listing.watchlist.add(self.guest)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/listings/{self.listing.pk}/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['reviews'][0]['reviewer_full_name'], self.guest.full_name)
+        for query in queries.captured_queries:
+            self.assertNotIn('"password"', query['sql'])
+
+@override_settings(LISTING_CACHE_ENABLED=True)
+class ListingCacheTests(ListingFixturesMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.url = f'/api/listings/{self.listing.pk}/'
+
+    def get_listing(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def cached(self):
+        return ListingCache.get_many(ListingCache.tokens([self.listing.pk])).get(self.listing.pk)
+
+    def assertCached(self):
+        self.assertIsNotNone(self.cached())
+
+    def assertNotCached(self):
+        self.assertIsNone(self.cached())
+
+    def test_retrieve_populates_cache(self):
+        self.assertNotCached()
+        self.get_listing()
+        self.assertCached()
+
+    @override_settings(LISTING_CACHE_ENABLED=False)
+    def test_disabled_cache_stores_nothing(self):
+        self.get_listing()
+        self.assertIsNone(cache.get(ListingCache.version_key(self.listing.pk)))
+
+    def test_fields_are_trimmed_from_the_full_entry(self):
+        response = self.client.get(self.url, {'fields': 'title,price_per_night'})
+        self.assertEqual(response.data, {'title': 'Cabin', 'price_per_night': '100.00'})
+        self.assertIn('reviews', self.cached())
+
+    @override_settings(LISTING_CACHE_ENABLED=False)
+    def test_disabled_cache_only_loads_requested_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/listings/', {'fields': 'title,price_per_night'})
+        self.assertEqual(response.data, [{'title': 'Cabin', 'price_per_night': '100.00'}])
+        tables = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('listings_review', tables)
+        self.assertNotIn('listings_propertyfeature', tables)
+
+    @override_settings(LISTING_CACHE_ENABLED=False)
+    def test_disabled_cache_skips_invalidation_queries(self):
+        self.host.first_name = 'Hanna'
+        with self.assertNumQueries(1):
+            self.host.save()
+        booking = self.make_booking(1, 2)
+        lean_booking = Booking.objects.only('booking_id', 'status').get(pk=booking.pk)
+        lean_booking.status = BookingStatus.CONFIRMED
+        with self.assertNumQueries(1):
+            lean_booking.save(update_fields=['status'])
+
+    def test_invalidation_waits_for_commit(self):
+        self.get_listing()
+        with self.captureOnCommitCallbacks(execute=True):
+            Listing.objects.get(pk=self.listing.pk).save()
+            self.assertCached()
+        self.assertNotCached()
+
+    def test_copy_read_before_commit_is_never_served(self):
+        stale = self.get_listing()
+        # A reader takes the version tokens, then a writer commits and
+        # invalidates before the reader caches what it loaded
+        tokens = ListingCache.tokens([self.listing.pk])
+        self.listing.title = 'Renamed cabin'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.listing.save()
+        ListingCache.set_many({self.listing.pk: stale}, tokens)
+
+        self.assertNotCached()
+        self.assertEqual(self.get_listing()['title'], 'Renamed cabin')
+
+    def test_watchlist_change_invalidates(self):
+        self.assertEqual(self.get_listing()['watchlist'], [])
+        self.client.force_authenticate(self.guest)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'{self.url}add_to_watchlist/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([user['user_id'] for user in self.get_listing()['watchlist']], [str(self.guest.pk)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.guest.likes.clear()
+        self.assertEqual(self.get_listing()['watchlist'], [])
+
+    def test_review_invalidates(self):
+        self.assertEqual(self.get_listing()['average_rating'], 'No Review')
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(listing=self.listing, reviewer=self.guest, rating=4, comment='Nice')
+        data = self.get_listing()
+        self.assertEqual(data['average_rating'], 4.0)
+        self.assertEqual(data['review_count'], 1)
+        self.assertEqual(data['reviews'][0]['reviewer_full_name'], self.guest.full_name)
+
+    def test_price_change_invalidates(self):
+        self.assertEqual(self.get_listing()['price_per_night'], '100.00')
+        self.client.force_authenticate(self.host)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(self.url, {'price_per_night': '120.00'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(self.get_listing()['price_per_night'], '120.00')
+
+    def test_review_removal_invalidates(self):
+        review = Review.objects.create(listing=self.listing, reviewer=self.guest, rating=2, comment='Meh')
+        self.assertEqual(self.get_listing()['review_count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        data = self.get_listing()
+        self.assertEqual(data['reviews'], [])
+        self.assertEqual(data['average_rating'], 'No Review')
+
+    def test_amenity_and_booking_invalidate(self):
+        self.get_listing()
+        with self.captureOnCommitCallbacks(execute=True):
+            PropertyFeature.objects.create(listing=self.listing, name=AmenityType.GYM, qty=1)
+        self.assertEqual([amenity['name'] for amenity in self.get_listing()['amenity']], ['GYM'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = self.make_booking(1, 2)
+        self.assertEqual(self.get_listing()['bookings'], [booking.pk])
+
+    def test_host_rename_invalidates(self):
+        self.get_listing()
+        self.host.first_name = 'Hanna'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.host.save()
+        self.assertEqual(self.get_listing()['host']['first_name'], 'Hanna')
+
+    def test_login_keeps_cache(self):
+        self.get_listing()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.login(username='host', password='pass')
+        self.assertCached()
+
+
+class PaymentInitiateTests(ListingFixturesMixin, APITestCase):
+    url = '/api/payments/initiate/'
+
+    def setUp(self):
+        super().setUp()
+        self.booking = self.make_booking(1, 2)
+
+    @staticmethod
+    def chapa_response(body):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = orjson.dumps(body)
+        return response
+
+    def initiate(self, body):
+        with mock.patch('listings.chapa.initialize_transaction', return_value=self.chapa_response(body)):
+            return self.client.post(self.url, {'booking_id': str(self.booking.pk)}, format='json')
+
+    def test_success_records_pending_payment(self):
+        response = self.initiate({'status': 'success', 'data': {'checkout_url': 'https://checkout.example/1'}})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['payment_url'], 'https://checkout.example/1')
+        self.assertEqual(Payment.objects.get(booking=self.booking).status, PaymentStatus.PENDING)
+
+    def test_missing_checkout_url_records_failed_payment(self):
+        for body in ({'status': 'success', 'data': None}, {'status': 'success'}, {'status': 'failed'}, []):
+            with self.subTest(body=body):
+                Payment.objects.all().delete()
+                response = self.initiate(body)
+                self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+                self.assertEqual(Payment.objects.get(booking=self.booking).status, PaymentStatus.FAILED)
+
+
+class BookingStatusTests(ListingFixturesMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other = Users.objects.create_user(username='other', email='other@example.com', password='pass')
+
+    def post(self, user, booking, action, **params):
+        self.client.force_authenticate(user)
+        query = ''.join(f'?{key}={value}' for key, value in params.items())
+        return self.client.post(f'/api/bookings/{booking.pk}/{action}/{query}')
+
+    def test_approve(self):
+        booking = self.make_booking(1, 2)
+        self.assertEqual(self.post(self.guest, booking, 'approve').status_code, status.HTTP_403_FORBIDDEN)
+        response = self.post(self.host, booking, 'approve')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'booking_id': str(booking.pk), 'status': BookingStatus.CONFIRMED})
+        self.assertEqual(self.post(self.host, booking, 'approve').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_guard_is_a_single_update_without_join(self):
+        booking = self.make_booking(1, 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.post(self.host, booking, 'approve')
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1, updates)
+        self.assertNotIn('JOIN', updates[0])
+        self.assertIn('"status" IN', updates[0])
+
+    def test_decline(self):
+        booking = self.make_booking(1, 2, status=BookingStatus.CONFIRMED)
+        self.assertEqual(self.post(self.guest, booking, 'decline').status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.post(self.host, booking, 'decline').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post(self.host, booking, 'decline').status_code, status.HTTP_400_BAD_REQUEST)
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, BookingStatus.DECLINED)
+
+    def test_cancel(self):
+        booking = self.make_booking(1, 2)
+        self.assertEqual(self.post(self.other, booking, 'cancel').status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.post(self.guest, booking, 'cancel').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.post(self.host, booking, 'cancel').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unknown_booking_is_not_found(self):
+        self.client.force_authenticate(self.host)
+        for pk in (uuid.uuid4(), 'not-a-uuid'):
+            with self.subTest(pk=pk):
+                response = self.client.post(f'/api/bookings/{pk}/approve/')
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_full_flag(self):
+        for value, full in (('1', True), ('true', True), ('Yes', True), ('0', False), ('false', False), ('', False)):
+            with self.subTest(full=value):
+                booking = self.make_booking(1, 2)
+                response = self.post(self.host, booking, 'approve', full=value)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual('listing_detail' in response.data, full)
@@ -4,10 +4,15 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework import status
 from django.db import transaction
+from django.db.models import Q
 from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import Http404
 import requests
 import uuid
 
+from . import chapa
+from .cache import ListingCache
 from .models import Listing, Booking, Payment, Review # Import Review for average rating calculation
 from .serializers import (
     ListingSerializer,
@@ -16,7 +21,11 @@ from .serializers import (
     ReviewSerializer # Potentially useful for nested writes, though not strictly required for these viewsets
 )
 from .enums import BookingStatus, PaymentStatus # Import BookingStatus for setting default status
-from .tasks import send_booking_confirmation_email
+from .tasks import send_booking_confirmation_emails, verify_chapa_payment
+
+
+# The permission checks are stateless, so one instance serves every request
+AUTHENTICATED_PERMISSIONS = (permissions.IsAuthenticated(),)
 
 
 class ListingViewSet(viewsets.ModelViewSet):
@@ -27,6 +36,15 @@ class ListingViewSet(viewsets.ModelViewSet):
     queryset = Listing.objects.all()
     serializer_class = ListingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly] # Allow authenticated users to write, others to read
+    # Actions open to authenticated users only
+    authenticated_actions = frozenset({'add_to_watchlist', 'remove_from_watchlist', 'book'})
+    # Listings fetched (and prefetched for) per round trip on cache misses.
+    list_chunk_size = 2000
+
+    def get_permissions(self):
+        if self.action in self.authenticated_actions:
+            return AUTHENTICATED_PERMISSIONS
+        return super().get_permissions()
 
     def perform_create(self, serializer):
         """
@@ -34,7 +52,100 @@ class ListingViewSet(viewsets.ModelViewSet):
         """
         serializer.save(host=self.request.user)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    def list(self, request, *args, **kwargs):
+        """
+        List listings through `ListingCache`. Only the primary keys are
+        queried up front; see `cached_representations`.
+        """
+        pks = self.filter_queryset(super().get_queryset()).values_list('pk', flat=True)
+        fields = ListingSerializer.requested_fields(request)
+
+        page = self.paginate_queryset(pks)
+        if page is not None:
+            return self.get_paginated_response(self.cached_representations(page, fields))
+        return Response(self.cached_representations(list(pks), fields))
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieve a listing through `ListingCache`.
+        """
+        try:
+            pk = uuid.UUID(str(kwargs[self.lookup_url_kwarg or self.lookup_field]))
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+
+        representations = self.cached_representations([pk], ListingSerializer.requested_fields(request))
+        if not representations:
+            raise Http404
+        return Response(representations[0])
+
+    def cached_representations(self, pks, fields=None):
+        """
+        Returns the representations of the listings in `pks`, in order and
+        trimmed to `fields`.
+
+        `ListingCache` holds full representations, so one entry serves every
+        `?fields=` selection; listings missing from it are serialized in full
+        and cached for later requests. When the cache is disabled, only
+        `fields` are loaded and rendered.
+        """
+        if not ListingCache.enabled():
+            return list(self.serialize_listings(pks, fields).values())
+
+        tokens = ListingCache.tokens(pks)
+        representations = ListingCache.get_many(tokens)
+        fresh = self.serialize_listings([pk for pk in pks if pk not in representations])
+        ListingCache.set_many(fresh, tokens)
+        representations.update(fresh)
+
+        return [
+            representations[pk] if fields is None
+            else {name: value for name, value in representations[pk].items() if name in fields}
+            for pk in pks if pk in representations
+        ]
+
+    def serialize_listings(self, pks, fields=None):
+        """
+        Returns a dict mapping the pks of the listings in `pks` that exist to
+        their representations, in order, trimmed to `fields`. Listings are
+        loaded `list_chunk_size` at a time so only one chunk of listings and
+        their prefetched relations is in memory.
+        """
+        queryset = self.get_listing_queryset(fields)
+        # The serializer trims itself to the request's `?fields=`
+        context = {'view': self, 'format': self.format_kwarg}
+        if fields is not None:
+            context['request'] = self.request
+
+        representations = {}
+        for start in range(0, len(pks), self.list_chunk_size):
+            listings = list(queryset.filter(pk__in=pks[start:start + self.list_chunk_size]))
+            serialized = ListingSerializer(listings, many=True, context=context).data
+            representations.update((listing.pk, dict(data)) for listing, data in zip(listings, serialized))
+        return {pk: representations[pk] for pk in pks if pk in representations}
+
+    def get_queryset(self):
+        """
+        Eager-load everything `ListingSerializer` renders.
+        """
+        return self.get_listing_queryset()
+
+    def get_listing_queryset(self, fields=None):
+        """
+        Eager-load the relations nested by `ListingSerializer`, skipping
+        whatever is not needed to render `fields` (None meaning all of them).
+        Reads only select the columns the serializer renders (no host
+        password, permissions, etc). Actions that do not render the listing
+        (watchlist, reviews, book, destroy) get the bare row.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            queryset = ListingSerializer.setup_eager_loading(queryset, fields)
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(*ListingSerializer.only_fields(fields))
+        return queryset
+
+    @action(detail=True, methods=['post'])
     def add_to_watchlist(self, request, pk=None):
         """
         Allows an authenticated user to add a listing to their watchlist.
@@ -42,13 +153,13 @@ class ListingViewSet(viewsets.ModelViewSet):
         listing = self.get_object()
         user = request.user
         
-        if user in listing.watchlist.all():
+        if listing.watchlist.filter(pk=user.pk).exists():
             return Response({'detail': 'Listing already in watchlist.'}, status=status.HTTP_400_BAD_REQUEST)
         
         listing.watchlist.add(user)
         return Response({'detail': 'Listing added to watchlist.'}, status=status.HTTP_200_OK)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['post'])
     def remove_from_watchlist(self, request, pk=None):
         """
         Allows an authenticated user to remove a listing from their watchlist.
@@ -56,7 +167,7 @@ class ListingViewSet(viewsets.ModelViewSet):
         listing = self.get_object()
         user = request.user
 
-        if user not in listing.watchlist.all():
+        if not listing.watchlist.filter(pk=user.pk).exists():
             return Response({'detail': 'Listing not in watchlist.'}, status=status.HTTP_400_BAD_REQUEST)
         
         listing.watchlist.remove(user)
@@ -68,11 +179,13 @@ class ListingViewSet(viewsets.ModelViewSet):
         Get all reviews for a specific listing.
         """
         listing = self.get_object()
-        reviews = listing.reviews.all()
+        # review.listing is already set to `listing` by the related manager;
+        # join the reviewer for reviewer_full_name
+        reviews = listing.reviews.select_related('reviewer')
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data)
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['post'])
     def book(self, request, pk=None):
         """
         Allows an authenticated user to book a specific listing.
@@ -97,7 +210,12 @@ class BookingViewSet(viewsets.ModelViewSet):
     """
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
-    permission_classes = [permissions.IsAuthenticated] # Only authenticated users can manage bookings
+    # `?full=` values that ask status changes for the full booking
+    full_values = frozenset({'1', 'true', 'yes'})
+
+    def get_permissions(self):
+        # Only authenticated users can manage bookings
+        return AUTHENTICATED_PERMISSIONS
 
     def get_queryset(self):
         """
@@ -107,11 +225,14 @@ class BookingViewSet(viewsets.ModelViewSet):
         For guests: see their own bookings.
         """
         user = self.request.user
+        queryset = BookingSerializer.setup_eager_loading(Booking.objects.all())
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.only(*BookingSerializer.only_fields())
         if user.is_staff: # Admins can see all bookings
-            return Booking.objects.all()
+            return queryset
         # Guests can see their own bookings
         # Hosts can see bookings for their listings
-        return Booking.objects.filter(guest=user) | Booking.objects.filter(listing__host=user)
+        return queryset.filter(Q(guest=user) | Q(listing__host=user))
 
     def perform_create(self, serializer):
         """
@@ -123,76 +244,83 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking = serializer.save(guest=self.request.user, status=BookingStatus.PENDING)
         
         # Trigger the Celery task to send the confirmation email
-        # Use .delay() to call the task asynchronously
-        send_booking_confirmation_email.delay(booking.id)
+        # Use .delay() to call the task asynchronously, once the booking is
+        # committed and visible to the worker
+        transaction.on_commit(lambda: send_booking_confirmation_emails.delay([booking.booking_id]))
+
+    def _change_status(self, pk, new_status, from_statuses, roles, action_name, invalid_message):
+        """
+        Moves booking `pk` to `new_status` with a single guarded UPDATE that
+        only matches while the booking is in one of `from_statuses` and the
+        requesting user holds one of `roles` ('guest', 'host') on it, so the
+        checks and the write cannot race. When nothing matched, the booking
+        is read back to tell 404, 403 and 400 apart.
+
+        Responds with just the booking id and new status, or the full
+        booking when the request has `?full=1`.
+        """
+        user = self.request.user
+        allowed = Q()
+        if 'guest' in roles:
+            allowed |= Q(guest=user)
+        if 'host' in roles:
+            # A subquery rather than a join, which would make backends that
+            # cannot self-select in an UPDATE (MySQL) split it into a SELECT
+            # and an unguarded UPDATE
+            allowed |= Q(listing__in=Listing.objects.filter(host=user).values('pk'))
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+        try:
+            updated = Booking.objects.filter(allowed, pk=pk, status__in=from_statuses).update(status=new_status)
+        except (ValueError, ValidationError):
+            # Malformed pk; get_object() below responds with 404
+            updated = 0
+
+        if not updated:
+            booking = self.get_object()
+            if not (('guest' in roles and booking.guest_id == user.pk)
+                    or ('host' in roles and booking.listing.host_id == user.pk)):
+                return Response({'detail': f'You are not authorized to {action_name} this booking.'}, 
+                                status=status.HTTP_403_FORBIDDEN)
+            return Response({'detail': invalid_message}, status=status.HTTP_400_BAD_REQUEST)
+
+        # The client already has the booking; only send it again on request
+        if self.request.query_params.get('full', '').lower() in self.full_values:
+            serializer = self.get_serializer(self.get_object())
+            return Response(serializer.data)
+        return Response({'booking_id': pk, 'status': new_status})
+
+    @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
         """
         Allows a host to approve a pending booking.
         """
-        booking = self.get_object()
-        user = request.user
-
-        # Only the host of the listing associated with the booking can approve
-        if booking.listing.host != user:
-            return Response({'detail': 'You are not authorized to approve this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN)
-        
-        if booking.status != BookingStatus.PENDING:
-            return Response({'detail': 'Booking is not pending and cannot be approved.'}, 
-                            status=status.HTTP_400_BAD_REQUEST)
-        
-        booking.status = BookingStatus.CONFIRMED
-        booking.save()
-        serializer = self.get_serializer(booking)
-        return Response(serializer.data)
+        return self._change_status(
+            pk, BookingStatus.CONFIRMED, [BookingStatus.PENDING], roles=('host',), action_name='approve',
+            invalid_message='Booking is not pending and cannot be approved.',
+        )
 
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['post'])
     def decline(self, request, pk=None):
         """
         Allows a host to decline a pending booking.
         """
-        booking = self.get_object()
-        user = request.user
+        return self._change_status(
+            pk, BookingStatus.DECLINED, [BookingStatus.PENDING, BookingStatus.CONFIRMED],
+            roles=('host',), action_name='decline',
+            invalid_message='Booking is already cancelled or completed.',
+        )
 
-        # Only the host of the listing associated with the booking can decline
-        if booking.listing.host != user:
-            return Response({'detail': 'You are not authorized to decline this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN)
-
-        if booking.status not in [BookingStatus.PENDING, BookingStatus.CONFIRMED]:
-            return Response({'detail': 'Booking is already cancelled or completed.'}, 
-                            status=status.HTTP_400_BAD_REQUEST)
-        
-        booking.status = BookingStatus.DECLINED
-        booking.save()
-        serializer = self.get_serializer(booking)
-        return Response(serializer.data)
-
-    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
+    @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """
         Allows the guest who made the booking, or the host, to cancel a booking.
         """
-        booking = self.get_object()
-        user = request.user
+        return self._change_status(
+            pk, BookingStatus.CANCELED, [BookingStatus.PENDING], roles=('guest', 'host'), action_name='cancel',
+            invalid_message='Booking cannot be cancelled from its current status.',
+        )
 
-        # Check if the user is the guest or the host of the listing
-        if booking.guest != user and booking.listing.host != user:
-            return Response({'detail': 'You are not authorized to cancel this booking.'}, 
-                            status=status.HTTP_403_FORBIDDEN)
 
-        if booking.status in [BookingStatus.CANCELED, BookingStatus.CONFIRMED, BookingStatus.DECLINED]:
-            return Response({'detail': 'Booking cannot be cancelled from its current status.'}, 
-                            status=status.HTTP_400_BAD_REQUEST)
-        
-        booking.status = BookingStatus.CANCELED
-        booking.save()
-        serializer = self.get_serializer(booking)
-        return Response(serializer.data)
-    
-    
 class PaymentViewSet(viewsets.ModelViewSet):
     """
     API endpoint that allows payments to be viewed, and a new payment
@@ -202,6 +330,8 @@ class PaymentViewSet(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     # This ensures that you can't create or update payments via standard CRUD
     http_method_names = ['post', 'get', 'head', 'options']
+    # Chapa callback base URL, when configured (see PAYMENT_CALLBACK_BASE)
+    callback_base = settings.PAYMENT_CALLBACK_BASE
 
     @action(detail=False, methods=['post'])
     def initiate(self, request):
@@ -220,8 +350,12 @@ class PaymentViewSet(viewsets.ModelViewSet):
             )
 
         try:
-            # Retrieve the booking and its related details
-            booking = Booking.objects.get(booking_id=booking_id)
+            # Retrieve the booking and its related details in one query,
+            # selecting only the columns used for the Chapa payload
+            booking = Booking.objects.select_related('listing', 'guest').only(
+                'booking_id', 'status', 'total_price', 'listing', 'guest',
+                'listing__title', 'guest__first_name', 'guest__last_name',
+            ).get(booking_id=booking_id)
             email = request.data.get("email")
             listing = booking.listing
             guest = booking.guest
@@ -239,150 +373,101 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        # Prepare the payload for the Chapa API
+        # Generate transaction reference
+        # The full 128-bit suffix makes a collision with the unique
+        # trnx_id (and a failed INSERT) practically impossible
+        tx_ref = f"booking-payment-{booking.booking_id}-{uuid.uuid4().hex}"
+
+        # Chapa payload
+        payload = {
+            "amount": str(booking.total_price),
+            "currency": "USD",  # Adjust currency as needed
+            "email": email,
+            "first_name": guest.first_name,
+            "last_name": guest.last_name,
+            "tx_ref": tx_ref,
+            "callback_url": f"{self.callback_base or request.build_absolute_uri('/api/payments/verify/')}{tx_ref}/",
+            "customization": {
+                "title": "Booking Payment",
+                "description": f"Payment for booking {booking.booking_id} on {listing.title}"
+            }
+        }
+
+        # Chapa is called before anything is written, so the payment record
+        # is inserted once, with its final status
+        try:
+            # Make the request to Chapa
+            chapa_response = chapa.initialize_transaction(payload)
+            chapa_response.raise_for_status()
+            response_data = chapa.response_json(chapa_response)
+        except requests.exceptions.RequestException as e:
+            # Handle network errors, record the failed payment
+            self._record_payment(booking, tx_ref, PaymentStatus.FAILED)
+            return Response(
+                {"error": f"Failed to connect to payment gateway: {str(e)}"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+
+        if not isinstance(response_data, dict):
+            response_data = {}
+        payment_url = None
+        if response_data.get('status') == 'success':
+            payment_url = (response_data.get('data') or {}).get('checkout_url')
+
+        # Record the outcome first, so the Chapa transaction is never left
+        # without a payment record
+        self._record_payment(booking, tx_ref, PaymentStatus.PENDING if payment_url else PaymentStatus.FAILED)
+
+        if not payment_url:
+            message = response_data.get('message') or 'no checkout URL was returned.'
+            return Response(
+                {"error": f"Payment initiation failed: Chapa initiation failed: {message}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return Response({
+            "message": "Payment initiated successfully.",
+            "payment_url": payment_url
+        }, status=status.HTTP_201_CREATED)
+
+    def _record_payment(self, booking, tx_ref, payment_status):
+        """
+        Inserts the payment record for an initiated Chapa transaction.
+        """
         # Use a database transaction to ensure atomicity
         with transaction.atomic():
-            # Prepare the payload for the Chapa API
-            # Generate transaction reference
-            tx_ref = f"booking-payment-{booking.booking_id}-{uuid.uuid4().hex[:8]}"
-        
-            # Create a payment record in PENDING status
-            payment = Payment.objects.create(
+            return Payment.objects.create(
                 booking=booking,
                 amount=booking.total_price,
-                status=PaymentStatus.PENDING,
+                status=payment_status,
                 trnx_id=tx_ref
             )
 
-            # Chapa payload
-            payload = {
-                "amount": str(booking.total_price),
-                "currency": "USD",  # Adjust currency as needed
-                "email": email,
-                "first_name": guest.first_name,
-                "last_name": guest.last_name,
-                "tx_ref": tx_ref,
-                "callback_url": f"{request.build_absolute_uri('/api/payments/verify/')}{payment.trnx_id}/",
-                "customization": {
-                    "title": "Booking Payment",
-                    "description": f"Payment for booking {booking.booking_id} on {listing.title}"
-                }
-            }
-
-            # Make the POST request to the Chapa API
-            url = "https://api.chapa.co/v1/transaction/initialize"
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}"
-            }
-
-            try:
-                # Make the request to Chapa
-                chapa_response = requests.post(url, json=payload, headers=headers)
-                chapa_response.raise_for_status()
-                response_data = chapa_response.json()
-                
-                if response_data.get('status') == 'success':
-                    return Response({
-                        "message": "Payment initiated successfully.",
-                        "payment_url": response_data.get('data').get('checkout_url')
-                    }, status=status.HTTP_201_CREATED)
-                else:
-                    # Chapa returned a failure message, update payment status
-                    payment.status = PaymentStatus.FAILED
-                    payment.save()
-                    raise Exception(f"Chapa initiation failed: {response_data.get('message')}")
-
-            except requests.exceptions.RequestException as e:
-                # Handle network errors, update payment status
-                payment.status = PaymentStatus.FAILED
-                payment.save()
-                return Response(
-                    {"error": f"Failed to connect to payment gateway: {str(e)}"},
-                    status=status.HTTP_503_SERVICE_UNAVAILABLE
-                )
-            except Exception as e:
-                # Handle any other errors during payment initiation
-                return Response(
-                    {"error": f"Payment initiation failed: {str(e)}"},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            
-    
     # The new custom action to verify a payment
-    @action(detail=False, methods=['get'])
-    def verify(self, request, tx_ref):
+    @action(detail=False, methods=['get'], url_path=r'verify/(?P<tx_ref>[^/.]+)')
+    def verify(self, request, tx_ref=None):
         """
         Custom action to verify a payment with Chapa using the transaction reference.
         
         This endpoint is designed to be the callback URL for Chapa.
-        The URL will be: /api/payments/verify/tx_ref=booking-payment-123-xyz
-        """
-        
-        if not tx_ref:
-            return Response(
-                {"error": "Transaction reference (tx_ref) is required."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Prepare the verification request to Chapa
-        url = f"https://api.chapa.co/v1/transaction/verify/{tx_ref}"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {settings.CHAPA_SECRET_KEY}"
-        }
-        
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()  # Raise an exception for bad status codes
-            response_data = response.json()
-        except requests.exceptions.RequestException as e:
-            # Handle network errors or non-2xx status codes
-            return Response(
-                {"error": f"Failed to verify with Chapa: {str(e)}"},
-                status=status.HTTP_503_SERVICE_UNAVAILABLE
-            )
-            
-        # Check the verification status
-        chapa_status = response_data.get('data', {}).get('status')
-        chapa_message = response_data.get('message', 'Verification response received.')
+        The URL will be: /api/payments/verify/booking-payment-123-xyz/
 
-        try:
-            payment = Payment.objects.get(trnx_id=tx_ref)
-        except Payment.DoesNotExist:
+        The call to Chapa and the status updates run in the
+        `verify_chapa_payment` Celery task, so this only checks that the
+        payment exists and responds with 202 Accepted.
+        """
+        if not Payment.objects.filter(trnx_id=tx_ref).exists():
             return Response(
                 {"error": "Payment record not found for this transaction reference."},
                 status=status.HTTP_404_NOT_FOUND
             )
-            
-        # Use a database transaction to ensure atomicity
-        with transaction.atomic():
-            if chapa_status == "success":
-                # If successful, update payment and booking statuses
-                payment.status = PaymentStatus.COMPLETED
-                payment.save()
-                
-                # Update the associated booking
-                booking = payment.booking
-                booking.status = BookingStatus.CONFIRMED
-                booking.save()
-                
-                # Send confirmation email
-                send_booking_confirmation_email.delay(booking.booking_id)
-                
-                return Response(
-                    {"message": "Payment successfully verified and records updated."},
-                    status=status.HTTP_200_OK
-                )
-            else:
-                # If failed, update payment status and return error
-                payment.status = PaymentStatus.FAILED
-                payment.save()
-                
-                return Response(
-                    {"error": f"Payment verification failed: {chapa_message}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
 
+        verify_chapa_payment.delay(tx_ref)
+        return Response(
+            {"message": "Payment verification started."},
+            status=status.HTTP_202_ACCEPTED
+        )
 
     @action(detail=False, methods=['get'])
     def status(self, request, pk=None):